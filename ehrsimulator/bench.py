@@ -0,0 +1,730 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for EHR Simulator hot paths.
+
+Usage:
+    python bench.py encode [--bundle PATH] [--repeat N]
+    python bench.py concurrent-saves [--concurrency N]   (needs DATABASE_URL)
+    python bench.py summary-storage [--versions N]
+    python bench.py diff [--repeat N]
+    python bench.py markup [--repeat N]
+    python bench.py vocab [--repeat N]
+    python bench.py observations [--repeat N]
+    python bench.py fhir-stats [--bundle PATH] [--repeat N]
+    python bench.py admit [--bundle PATH] [--count N]   (needs DATABASE_URL)
+    python bench.py scale [--resources N] [--repeat N]
+    python bench.py tracing [--requests N] [--repeat N]   (needs DATABASE_URL)
+    python bench.py logging [--requests N] [--repeat N]   (needs DATABASE_URL)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+SAMPLE_BUNDLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nurseassistant", "synthea_patient_sample.json")
+
+
+def timed(fn, repeat: int) -> float:
+    """Run fn `repeat` times and return the best wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
+
+
+def load_bundle(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def bench_encode(args):
+    """GET /patients/{id} body encoding and compression, before and after."""
+    from fastapi.encoders import jsonable_encoder
+    from responses import COMPRESSORS, encode_json
+
+    bundle = load_bundle(args.bundle)
+    payload = {"id": 1, "synthea_id": "sample", "data": bundle}
+    raw_data = json.dumps(bundle).encode("utf-8")
+
+    def default_path():
+        # FastAPI's default: jsonable_encoder walk + JSONResponse.render
+        return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode("utf-8")
+
+    def orjson_path():
+        return encode_json(payload)
+
+    def spliced_path():
+        # Bundle selected as text from Postgres, never parsed in Python
+        return encode_json({"id": 1, "synthea_id": "sample"})[:-1] + b',"data":' + raw_data + b"}"
+
+    rows = []
+    for name, fn in [("jsonable_encoder+json", default_path), ("orjson", orjson_path), ("db text splice", spliced_path)]:
+        rows.append([name, f"{timed(fn, args.repeat):.2f}", len(fn())])
+    print("Encode")
+    print_table(["path", "ms", "bytes"], rows)
+
+    body = spliced_path()
+    rows = [["identity", "0.00", len(body), "100.0%"]]
+    for encoding, compress in COMPRESSORS.items():
+        size = len(compress(body))
+        rows.append([encoding, f"{timed(lambda: compress(body), args.repeat):.2f}", size, f"{100 * size / len(body):.1f}%"])
+    print("\nOn the wire")
+    print_table(["encoding", "ms", "bytes", "ratio"], rows)
+
+
+def bench_concurrent_saves(args):
+    """Concurrent POST /patients/{id}/summary for one patient; verifies race-free versioning."""
+    import httpx
+    from sqlalchemy import select
+    import main
+
+    async def run():
+        await main.init_database()
+        async with main.async_session() as session:
+            patient = main.Patient(synthea_id=f"bench-{uuid.uuid4()}", data={"resourceType": "Bundle", "entry": []})
+            session.add(patient)
+            await session.commit()
+            await session.refresh(patient)
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.post(f"/patients/{patient.id}/summary", json={"type": "current", "content": f"Summary revision {i}"})
+                for i in range(args.concurrency)
+            ))
+            elapsed = time.perf_counter() - start
+
+        async with main.async_session() as session:
+            result = await session.execute(
+                select(main.PatientSummary.version, main.PatientSummary.is_active)
+                .where(main.PatientSummary.patient_id == patient.id)
+            )
+            rows = result.all()
+
+        failed = [r.status_code for r in responses if r.status_code != 200]
+        versions = sorted(version for version, _ in rows)
+        active = [version for version, is_active in rows if is_active]
+        print(f"{args.concurrency} concurrent saves in {elapsed * 1000:.1f} ms ({args.concurrency / elapsed:.0f} saves/s)")
+        print(f"failed requests: {len(failed)}  versions: {versions[:3]}...{versions[-3:]}  active: {active}")
+        ok = not failed and versions == list(range(1, args.concurrency + 1)) and active == [args.concurrency]
+        print("OK" if ok else "FAILED: versions must be 1..N with only the last one active")
+        return ok
+
+    if not asyncio.run(run()):
+        sys.exit(1)
+
+
+def build_summary_chain(versions: int, seed: int = 7) -> list:
+    """
+    A realistic chain of 'current' summary versions: a multi-section clinical
+    summary where each version edits a line or two and appends a progress note.
+    Returns [(content, highlighted_html), ...].
+    """
+    rng = random.Random(seed)
+    lines = [
+        "## Current Clinical Status\n",
+        "Patient is a 67-year-old male admitted for community-acquired pneumonia.\n",
+        "Vital signs: HR 88 bpm, BP 132/84 mmHg, RR 18/min, SpO2 95% on room air, T 37.4 C.\n",
+        "## Active Problems\n",
+    ]
+    lines += [f"- Problem {i}: chronic condition under management, last reviewed day {i}.\n" for i in range(1, 15)]
+    lines += ["## Medications\n"]
+    lines += [f"- Medication {i} {rng.choice([5, 10, 20, 40])} mg daily, tolerating well.\n" for i in range(1, 12)]
+    lines += ["## Plan\n", "Continue current management and monitor vital signs every 4 hours.\n", "## Progress Notes\n"]
+
+    chain = []
+    for version in range(1, versions + 1):
+        changed = set()
+        for _ in range(rng.randint(1, 2)):
+            i = rng.randrange(1, len(lines))
+            if not lines[i].startswith("##"):
+                lines[i] = lines[i].rstrip("\n").rsplit(" ", 1)[0] + f" (rev {version}).\n"
+                changed.add(i)
+        lines.append(f"- Day {version}: HR {rng.randint(60, 110)} bpm, SpO2 {rng.randint(90, 99)}%, "
+                     f"patient {rng.choice(['resting comfortably', 'ambulating', 'reports mild pain', 'stable overnight'])}.\n")
+        changed.add(len(lines) - 1)
+        content = "".join(lines)
+        highlighted = '<div class="summary-content">' + "".join(
+            f'<span class="highlight-new">{line}</span>' if i in changed else line for i, line in enumerate(lines)
+        ) + "</div>"
+        chain.append((content, highlighted))
+    return chain
+
+
+def bench_summary_storage(args):
+    """Bytes stored for a summary version chain, full copies vs snapshot + deltas."""
+    from summary_store import SNAPSHOT_INTERVAL, decode_delta, encode_delta, is_snapshot_version, snapshot_version_for
+
+    chain = build_summary_chain(args.versions)
+    full_bytes = sum(len(c) + len(h) for c, h in chain)
+
+    stored = []
+    start = time.perf_counter()
+    for version, (content, highlighted) in enumerate(chain, start=1):
+        # The last version stays active (and therefore full)
+        if version == len(chain) or is_snapshot_version(version):
+            stored.append(("full", content, highlighted))
+            continue
+        base_content, base_highlighted = chain[snapshot_version_for(version) - 1]
+        delta = encode_delta(base_content, content, base_highlighted, highlighted)
+        if len(delta) < len(content) + len(highlighted):
+            stored.append(("delta", delta, None))
+        else:
+            stored.append(("full", content, highlighted))
+    encode_ms = (time.perf_counter() - start) * 1000
+    stored_bytes = sum(len(c) + len(h or "") for _, c, h in stored)
+
+    start = time.perf_counter()
+    for version, (storage, content, _) in enumerate(stored, start=1):
+        if storage == "delta":
+            base_content, base_highlighted = chain[snapshot_version_for(version) - 1]
+            assert decode_delta(base_content, base_highlighted, content) == chain[version - 1]
+    decode_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{args.versions} versions, snapshot every {SNAPSHOT_INTERVAL}, final summary {len(chain[-1][0])} chars")
+    print_table(["storage", "bytes", "ratio"], [
+        ["full copies", full_bytes, "100.0%"],
+        ["snapshot + deltas", stored_bytes, f"{100 * stored_bytes / full_bytes:.1f}%"],
+    ])
+    print(f"encode {encode_ms:.1f} ms total, reconstruct+verify {decode_ms:.1f} ms total")
+
+
+CLINICAL_WORDS = (
+    "patient reports improved pain control overnight with stable vital signs and adequate urine output "
+    "blood pressure remains elevated despite lisinopril titration continue monitoring every four hours "
+    "glucose readings trending down after insulin adjustment no episodes of hypoglycemia recorded "
+    "wound site clean dry intact without erythema plan follow up with cardiology next week"
+).split()
+
+
+def build_summary_text(target_bytes: int, rng: random.Random) -> list:
+    """Sentences of clinical-sounding filler totalling roughly target_bytes."""
+    sentences, size = [], 0
+    while size < target_bytes:
+        sentence = " ".join(rng.choice(CLINICAL_WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "."
+        sentences.append(sentence)
+        size += len(sentence) + 1
+    return sentences
+
+
+def legacy_highlight_changes(old_text: str, new_text: str) -> str:
+    """highlight_changes as it was before the Myers diff engine (O(n*m) substring checks)."""
+    import re
+    old_sentences = [s.strip() for s in re.split(r'[.!?]', old_text) if s.strip()]
+    new_sentences = [s.strip() for s in re.split(r'[.!?]', new_text) if s.strip()]
+    highlighted_content = []
+    for sentence in new_sentences:
+        is_new = True
+        for old_sentence in old_sentences:
+            if sentence.lower() in old_sentence.lower() or old_sentence.lower() in sentence.lower():
+                is_new = False
+                break
+        highlighted_content.append(f'<span class="highlight-new">{sentence}.</span>' if is_new else f'{sentence}.')
+    return f'<div class="summary-content">{" ".join(highlighted_content)}</div>'
+
+
+def bench_diff(args):
+    """highlight_changes on summaries from 1 KB to 200 KB, legacy vs Myers sentence diff."""
+    from summary_diff import diff_sentences, render_diff_html
+
+    rng = random.Random(11)
+    rows = []
+    for size in (1_000, 10_000, 50_000, 200_000):
+        old = build_summary_text(size, rng)
+        new = list(old)
+        # ~5% edits: rewrites, insertions and moves
+        for _ in range(max(1, len(new) // 20)):
+            roll = rng.random()
+            if roll < 0.4:
+                new[rng.randrange(len(new))] = build_summary_text(1, rng)[0]
+            elif roll < 0.7:
+                new.insert(rng.randrange(len(new) + 1), build_summary_text(1, rng)[0])
+            else:
+                new.insert(rng.randrange(len(new)), new.pop(rng.randrange(len(new))))
+        old_text, new_text = " ".join(old), " ".join(new)
+        repeat = args.repeat if size < 100_000 else 1
+        legacy_ms = timed(lambda: legacy_highlight_changes(old_text, new_text), repeat)
+        myers_ms = timed(lambda: render_diff_html(diff_sentences(old_text, new_text)), repeat)
+        rows.append([f"{len(old_text) // 1000} KB", len(old), f"{legacy_ms:.2f}", f"{myers_ms:.2f}", f"{legacy_ms / myers_ms:.1f}x"])
+    print_table(["size", "sentences", "legacy ms", "myers ms", "speedup"], rows)
+
+
+def legacy_process_llm_response_with_changes(llm_response: str, previous_summary: str = None) -> dict:
+    """process_llm_response_with_changes as it was before the single-pass parser."""
+    import re
+    deletions = re.findall(r'~~(.*?)~~', llm_response, re.DOTALL)
+    additions = re.findall(r'\*\*(.*?)\*\*', llm_response, re.DOTALL)
+    clean_summary = re.sub(r'~~(.*?)~~', r'\1', llm_response)
+    clean_summary = re.sub(r'\*\*(.*?)\*\*', r'\1', clean_summary)
+    highlighted_html = clean_summary
+    for deletion in deletions:
+        highlighted_html = highlighted_html.replace(deletion, f'<span class="highlight-deleted" style="text-decoration: line-through; color: #999;">{deletion}</span>')
+    for addition in additions:
+        highlighted_html = highlighted_html.replace(addition, f'<span class="highlight-added" style="font-weight: bold; color: #28a745;">{addition}</span>')
+    return {"clean_summary": clean_summary, "highlighted_html": highlighted_html}
+
+
+def bench_markup(args):
+    """Change-markup parsing, legacy regex + str.replace vs single-pass parser (whole and streamed)."""
+    from change_markup import ChangeMarkupParser, parse_change_markup
+
+    rng = random.Random(5)
+    rows = []
+    for size, change_rate in ((2_000, 0.1), (20_000, 0.1), (100_000, 0.1), (100_000, 0.3)):
+        parts = []
+        for sentence in build_summary_text(size, rng):
+            roll = rng.random()
+            if roll < change_rate / 2:
+                parts.append(f"~~{sentence}~~")
+            elif roll < change_rate:
+                parts.append(f"**{sentence}**")
+            else:
+                parts.append(sentence)
+        response = " ".join(parts)
+        chunks = [response[i:i + 16] for i in range(0, len(response), 16)]
+
+        def streamed():
+            parser = ChangeMarkupParser()
+            for chunk in chunks:
+                parser.feed(chunk)
+            return parser.result()
+
+        legacy_ms = timed(lambda: legacy_process_llm_response_with_changes(response), args.repeat)
+        single_ms = timed(lambda: parse_change_markup(response), args.repeat)
+        stream_ms = timed(streamed, args.repeat)
+        changes = sum(1 for p in parts if p.startswith(("~~", "**")))
+        rows.append([f"{len(response) // 1000} KB", changes, f"{legacy_ms:.2f}", f"{single_ms:.2f}", f"{stream_ms:.2f}"])
+    print_table(["size", "changes", "legacy ms", "single-pass ms", "streamed (16-char chunks) ms"], rows)
+
+
+def legacy_indicator_score(vocabulary: dict, previous_summary: str, new_data: str) -> int:
+    """assess_clinical_significance scoring as it was before the compiled matcher (one `in` scan per term)."""
+    new_lower = new_data.lower()
+    previous_lower = previous_summary.lower()
+    score = 0
+    for category in vocabulary.values():
+        for term in category["terms"]:
+            if term in new_lower and not (category.get("new_only") and term in previous_lower):
+                score += category["weight"]
+    return score
+
+
+def bench_vocab(args):
+    """Clinical significance scoring on ~20 KB of text, per-term substring scans vs compiled trie matcher."""
+    from clinical_vocab import DEFAULT_VOCABULARY, ClinicalVocabulary, score_indicators
+
+    rng = random.Random(9)
+    previous = " ".join(build_summary_text(20_000, rng))
+    new_data = " ".join(build_summary_text(20_000, rng)) + " patient now unstable, possible sepsis; surgery scheduled."
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    rows = []
+    for size in (0, 1_000, 10_000):
+        vocabulary = {name: dict(category, terms=list(category["terms"])) for name, category in DEFAULT_VOCABULARY.items()}
+        # Pad each category with synthetic multi-word terms, as a hospital formulary would
+        names = list(vocabulary)
+        for i in range(size):
+            term = " ".join("".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(rng.randint(1, 3)))
+            vocabulary[names[i % len(names)]]["terms"].append(term)
+        compiled = ClinicalVocabulary(vocabulary)
+        legacy_ms = timed(lambda: legacy_indicator_score(vocabulary, previous, new_data), args.repeat)
+        compiled_ms = timed(lambda: score_indicators(previous, new_data, compiled), args.repeat)
+        rows.append([len(compiled), f"{legacy_ms:.2f}", f"{compiled_ms:.2f}"])
+    print_table(["terms", "legacy ms", "compiled ms"], rows)
+
+
+def build_observation_bundle(count: int, seed: int = 11) -> dict:
+    """
+    Bundle of `count` numeric observations (vitals, BP panels and labs) spread over ten years. Every
+    97th has no code, as some imported records do, so the benchmarks also run that path.
+    """
+    from observation_analytics import REFERENCE_RANGES, BLOOD_PRESSURE_CODES
+
+    rng = random.Random(seed)
+    codes = [code for code in REFERENCE_RANGES if code not in BLOOD_PRESSURE_CODES]
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    entries = []
+    for i in range(count):
+        when = (start + timedelta(minutes=i * 105)).isoformat()
+        if i % 10 == 0:
+            entries.append({"resource": {
+                "resourceType": "Observation", "effectiveDateTime": when,
+                "code": {"coding": [{"code": "85354-9"}], "text": "Blood pressure panel"},
+                "component": [
+                    {"code": {"coding": [{"code": "8480-6"}]}, "valueQuantity": {"value": rng.gauss(125, 8), "unit": "mm[Hg]"}},
+                    {"code": {"coding": [{"code": "8462-4"}]}, "valueQuantity": {"value": rng.gauss(78, 6), "unit": "mm[Hg]"}},
+                ],
+            }})
+            continue
+        if i % 97 == 0:
+            entries.append({"resource": {
+                "resourceType": "Observation", "effectiveDateTime": when,
+                "valueQuantity": {"value": round(rng.uniform(1, 10), 2), "unit": "1"},
+            }})
+            continue
+        code = codes[i % len(codes)]
+        _, low, high, unit = REFERENCE_RANGES[code]
+        value = rng.gauss((low + high) / 2, (high - low) / 6)
+        entries.append({"resource": {
+            "resourceType": "Observation", "effectiveDateTime": when,
+            "code": {"coding": [{"code": code}]}, "valueQuantity": {"value": round(value, 2), "unit": unit},
+        }})
+    return {"resourceType": "Bundle", "entry": entries}
+
+
+def bench_observations(args):
+    """Numeric significance scoring for a patient with 50k observations: flatten (cold) vs analyze + score (cached)."""
+    from observation_analytics import ObservationTable, get_observation_table, observation_signals, score_signals
+
+    bundle = build_observation_bundle(50_000)
+    since = bundle["entry"][-200]["resource"]["effectiveDateTime"]
+    since_seconds = datetime.fromisoformat(since).timestamp()
+    table = get_observation_table(1, 1, bundle)
+    rows = [
+        ["flatten bundle (cold, once per version)", f"{timed(lambda: ObservationTable.from_bundle(bundle), args.repeat):.2f}"],
+        ["analyze since last summary (cached table)", f"{timed(lambda: table.analyze(since_seconds), args.repeat):.2f}"],
+        ["observation_signals + score_signals (cached)",
+         f"{timed(lambda: score_signals(observation_signals(1, 1, bundle, since=since)), args.repeat):.2f}"],
+    ]
+    signals = observation_signals(1, 1, bundle, since=since)
+    print(f"{len(table)} numeric values across {len(table.codes)} codes; {len(signals)} codes with new data, "
+          f"score {score_signals(signals)['score']}")
+    print_table(["step", "ms"], rows)
+
+
+def legacy_observation_stats(entries: list) -> str:
+    """Observation handling of get_fhir_stats before per-code aggregation (dict per resource, last 5/10 kept)."""
+    observations = []
+    for entry in entries:
+        resource = entry.get("resource", {})
+        if resource.get("resourceType") == "Observation":
+            observations.append({
+                "code": resource.get("code", {}).get("text", "Unknown observation"),
+                "value": resource.get("valueQuantity", {}).get("value", resource.get("valueString", "Unknown value")),
+                "unit": resource.get("valueQuantity", {}).get("unit", ""),
+                "status": resource.get("status", "Unknown"),
+                "category": [cat.get("coding", [{}])[0].get("display", "Unknown") for cat in resource.get("category", [])],
+            })
+    vitals = [obs for obs in observations if "vital" in str(obs.get("category", [])).lower()]
+    labs = [obs for obs in observations if "laboratory" in str(obs.get("category", [])).lower()]
+    return "\n".join([
+        "Recent Vital Signs: " + "; ".join(f"{v['code']}: {v['value']} {v['unit']}".strip() for v in vitals[-5:]),
+        "Recent Lab Results: " + "; ".join(f"{v['code']}: {v['value']} {v['unit']}".strip() for v in labs[-10:]),
+    ])
+
+
+def bench_fhir_stats(args):
+    """Observation section of get_fhir_stats: per-resource dicts (last 5/10) vs per-code series (full history)."""
+    from observation_analytics import ObservationTable, format_series
+
+    def aggregated(bundle, table=None):
+        table = table or ObservationTable.from_bundle(bundle)
+        return "; ".join(format_series(item) for item in table.summarize())
+
+    rows = []
+    sample = load_bundle(args.bundle)
+    for label, bundle in (("sample bundle", sample), ("50k observations", build_observation_bundle(50_000))):
+        for entry in bundle["entry"]:
+            entry["resource"].setdefault("category", [{"coding": [{"code": "vital-signs", "display": "Vital signs"}]}])
+        table = ObservationTable.from_bundle(bundle)
+        legacy_ms = timed(lambda: legacy_observation_stats(bundle["entry"]), args.repeat)
+        cold_ms = timed(lambda: aggregated(bundle), args.repeat)
+        cached_ms = timed(lambda: aggregated(bundle, table), args.repeat)
+        rows.append([label, f"{legacy_ms:.2f}", len(legacy_observation_stats(bundle["entry"])),
+                     f"{cold_ms:.2f}", f"{cached_ms:.2f}", len(aggregated(bundle, table)), len(table.codes)])
+    print_table(["input", "legacy ms", "legacy chars", "series ms (cold)", "series ms (cached)", "series chars", "codes"], rows)
+
+
+def bench_admit(args):
+    """Single-admit loop vs bulk admission (multi-row inserts, one transaction); Synthea is stubbed out."""
+    import copy
+    import httpx
+    # Measure the write path only: no pool, no background summaries
+    os.environ["PATIENT_POOL_TARGET"] = "0"
+    os.environ["SPECULATIVE_SUMMARIES"] = "off"
+    import main
+
+    template = load_bundle(args.bundle)
+
+    def make_bundles(n: int) -> list:
+        bundles = []
+        for _ in range(n):
+            bundle = copy.deepcopy(template)
+            for entry in bundle.get("entry", []):
+                if entry.get("resource", {}).get("resourceType") == "Patient":
+                    entry["resource"]["id"] = str(uuid.uuid4())
+                    break
+            bundles.append(bundle)
+        return bundles
+
+    async def run():
+        await main.init_database()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            results = []
+            bundles = make_bundles(args.count)
+            async def stub_fetch():
+                return bundles.pop()
+            main.fetch_synthea_patient = stub_fetch
+            start = time.perf_counter()
+            for _ in range(args.count):
+                response = await client.post("/admit-patient")
+                response.raise_for_status()
+            single = time.perf_counter() - start
+            results.append(("single-admit loop", single))
+
+            bundles.extend(make_bundles(args.count))
+            start = time.perf_counter()
+            response = await client.post("/admit-patients", json={"count": args.count})
+            bulk = time.perf_counter() - start
+            done = json.loads(response.text.strip().splitlines()[-1])
+            if done["event"] != "done" or done["inserted"] != args.count:
+                print(f"FAILED: bulk admission returned {done}")
+                return False
+            results.append(("bulk admission", bulk))
+
+        size_mb = len(json.dumps(template)) / 1e6
+        print(f"{args.count} patients, {size_mb:.1f} MB bundle each")
+        print_table(["path", "seconds", "rows/s", "speedup"], [
+            (name, f"{elapsed:.2f}", f"{args.count / elapsed:.1f}", f"{single / elapsed:.1f}x") for name, elapsed in results
+        ])
+        return True
+
+    if not asyncio.run(run()):
+        sys.exit(1)
+
+
+def bench_scale(args):
+    """Summary input preparation on seeded synthetic bundles at 1x, 10x and 100x the base size."""
+    import orjson
+    from synthetic_bundles import generate_bundle
+    from timeline import build_timeline
+    from observation_analytics import observation_signals
+    import main
+
+    rows = []
+    versions = iter(range(1, 10 ** 6))
+    for factor in (1, 10, 100):
+        resources = args.resources * factor
+        start = time.perf_counter()
+        bundle = generate_bundle(seed=factor, resources=resources, years=10 * factor ** 0.5)
+        generate_ms = (time.perf_counter() - start) * 1000
+        size_mb = len(orjson.dumps(bundle)) / 1e6
+        repeat = max(args.repeat // factor, 2)
+        rows.append([
+            f"{factor}x", len(bundle["entry"]), f"{size_mb:.1f}", f"{generate_ms:.0f}",
+            f"{timed(lambda: orjson.loads(orjson.dumps(bundle)), repeat):.1f}",
+            f"{timed(lambda: main.get_fhir_sections(bundle), repeat):.1f}",
+            f"{timed(lambda: build_timeline(bundle), repeat):.1f}",
+            # a new version per run keeps the observation table cold
+            f"{timed(lambda: observation_signals(0, next(versions), bundle), repeat):.1f}",
+        ])
+    print_table(["scale", "resources", "MB", "generate ms", "json round trip ms", "sections ms", "timeline ms", "signals ms"], rows)
+
+
+# Telemetry settings compared by the tracing benchmark; console output goes to /dev/null
+TRACING_CONFIGS = {
+    "off": {"TELEMETRY_PROFILE": "off"},
+    "development": {"TELEMETRY_PROFILE": "development"},
+    "production": {"TELEMETRY_PROFILE": "production", "TELEMETRY_CONSOLE": "on"},
+    "production minimal": {"TELEMETRY_PROFILE": "production", "TELEMETRY_CONSOLE": "on", "TELEMETRY_VERBOSITY": "minimal"},
+    "production detailed": {"TELEMETRY_PROFILE": "production", "TELEMETRY_CONSOLE": "on", "TELEMETRY_VERBOSITY": "detailed"},
+    "production 10% head": {"TELEMETRY_PROFILE": "production", "TELEMETRY_CONSOLE": "on", "TELEMETRY_SAMPLE_RATIO": "0.1"},
+    "production tail": {"TELEMETRY_PROFILE": "production", "TELEMETRY_CONSOLE": "on", "TELEMETRY_TAIL_SAMPLING": "on"},
+}
+
+
+# Logging settings compared by the logging benchmark; every process runs with tracing off.
+# "previous" is the old setup: handlers called on the event loop, every SQL statement logged
+# (echo=True) and the per-call LLM details at INFO.
+LOGGING_CONFIGS = {
+    "previous": {"LOG_QUEUE": "off", "LOG_LEVELS": "sqlalchemy.engine=INFO,ehrsimulator.llm=DEBUG"},
+    "synchronous": {"LOG_QUEUE": "off"},
+    "queue": {},
+    "queue json": {"LOG_FORMAT": "json"},
+    "queue, SQL at INFO": {"LOG_LEVELS": "sqlalchemy.engine=INFO"},
+}
+
+
+def endpoint_child(args):
+    """One tracing or logging configuration (from the environment): per-request wall and CPU time per endpoint."""
+    import copy
+    import logging
+    import httpx
+    os.environ["PATIENT_POOL_TARGET"] = "0"
+    os.environ["SPECULATIVE_SUMMARIES"] = "off"
+    os.environ["SUMMARY_DRAFTS"] = "off"
+    # Nothing listens here: summaries run the pipeline and fail fast at the LLM call
+    os.environ["OLLAMA_URL"] = "http://127.0.0.1:9/v1/chat/completions"
+    import main
+    from logging_config import shutdown_logging
+    if args.benchmark == "tracing":
+        # Tracing only; logging cost is the same in every configuration
+        logging.disable(logging.CRITICAL)
+    else:
+        # The benchmark client's own request lines are not server work
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    async def run():
+        await main.init_database()
+        # What on_startup does
+        main.setup_telemetry()
+        main.instrument_fastapi(main.app)
+        main.instrument_httpx()
+        main.instrument_sqlalchemy(main.engine.sync_engine)
+        main.instrument_logging()
+        async with main.async_session() as session:
+            patient = main.Patient(synthea_id=f"bench-{uuid.uuid4()}", data=copy.deepcopy(load_bundle(args.bundle)))
+            session.add(patient)
+            await session.commit()
+        requests = [
+            ("GET /models/routing", "GET", "/models/routing", None, args.requests),
+            ("GET /patients/{id}", "GET", f"/patients/{patient.id}", None, args.requests),
+            # Much slower per request, so fewer of them
+            ("POST summarize", "POST", f"/patients/{patient.id}/summarize", {"summary_type": "current", "use_draft": False}, max(args.requests // 5, 1)),
+        ]
+        results = {}
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name, method, path, body, count in requests:
+                for _ in range(max(count // 10, 1)):
+                    await client.request(method, path, json=body)
+                latencies = []
+                cpu_start = time.process_time()
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = await client.request(method, path, json=body)
+                    latencies.append(time.perf_counter() - start)
+                    response.raise_for_status()
+                # process_time also counts the batch exporter thread
+                cpu = time.process_time() - cpu_start
+                latencies.sort()
+                results[name] = {"p50": latencies[len(latencies) // 2], "p99": latencies[int(0.99 * (len(latencies) - 1))],
+                                 "cpu": cpu / count}
+        if args.benchmark == "logging":
+            # The cost a log call puts on the event loop, without the request around it
+            latencies = []
+            count = args.requests * 10
+            cpu_start = time.process_time()
+            for index in range(count):
+                start = time.perf_counter()
+                main.logger.info("Benchmark record %d for patient %s", index, patient.id)
+                latencies.append(time.perf_counter() - start)
+            # Includes the listener thread writing out the queue
+            shutdown_logging()
+            cpu = time.process_time() - cpu_start
+            latencies.sort()
+            results["logger.info call"] = {"p50": latencies[len(latencies) // 2], "p99": latencies[int(0.99 * (len(latencies) - 1))],
+                                           "cpu": cpu / count}
+        main.shutdown_telemetry()
+        async with main.async_session() as session:
+            await session.delete(await session.get(main.Patient, patient.id))
+            await session.commit()
+        await main.engine.dispose()
+        return results
+
+    results = asyncio.run(run())
+    # Flush queued log lines so they cannot interleave with the result line
+    shutdown_logging()
+    sys.stderr.write("RESULT " + json.dumps(results) + "\n")
+
+
+def compare_endpoint_configs(args, configs: dict, env: dict):
+    """
+    Runs endpoint_child once per configuration, in its own process (tracer provider and logging
+    setup are process-wide). Configurations are interleaved over --repeat rounds and the best
+    round per endpoint is reported against the first configuration.
+    """
+    import subprocess
+    measured = {}
+    for _ in range(args.repeat):
+        for name, config in configs.items():
+            # Console logging goes to the stderr pipe, as it would under a process manager
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), args.benchmark, "--child", "--requests", str(args.requests), "--bundle", args.bundle],
+                env={**os.environ, **env, **config}, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            )
+            lines = [line for line in process.stderr.splitlines() if line.startswith("RESULT ")]
+            if process.returncode != 0 or not lines:
+                print(f"FAILED: {name}\n{process.stderr[-2000:]}")
+                sys.exit(1)
+            for endpoint, result in json.loads(lines[-1][len("RESULT "):]).items():
+                best = measured.setdefault(name, {}).get(endpoint)
+                if best is None or result["cpu"] < best["cpu"]:
+                    measured[name][endpoint] = result
+
+    print(f"{args.requests} requests per endpoint ({max(args.requests // 5, 1)} summarize), in-process ASGI client, best of {args.repeat} rounds")
+    first = next(iter(configs))
+    rows = []
+    for name, results in measured.items():
+        for endpoint, result in results.items():
+            baseline = measured[first][endpoint]
+            rows.append([name, endpoint, f"{result['p50'] * 1e6:.0f}", f"{result['p99'] * 1e6:.0f}", f"{(result['p50'] - baseline['p50']) * 1e6:+.0f}",
+                         f"{result['cpu'] * 1e6:.0f}", f"{(result['cpu'] - baseline['cpu']) * 1e6:+.0f}"])
+    print_table(["config", "endpoint", "p50 us", "p99 us", f"p50 vs {first}", "cpu us/request", f"cpu vs {first}"], rows)
+
+
+def bench_tracing(args):
+    """Per-request cost of each tracing configuration."""
+    compare_endpoint_configs(args, TRACING_CONFIGS, {})
+
+
+def bench_logging(args):
+    """Per-request cost of each logging configuration, with log files in a temporary directory."""
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        compare_endpoint_configs(args, LOGGING_CONFIGS, {"TELEMETRY_PROFILE": "off", "LOG_FILE": os.path.join(directory, "ehrsimulator.log")})
+
+
+BENCHMARKS = {
+    "encode": bench_encode,
+    "concurrent-saves": bench_concurrent_saves,
+    "summary-storage": bench_summary_storage,
+    "diff": bench_diff,
+    "markup": bench_markup,
+    "vocab": bench_vocab,
+    "observations": bench_observations,
+    "fhir-stats": bench_fhir_stats,
+    "admit": bench_admit,
+    "scale": bench_scale,
+    "tracing": bench_tracing,
+    "logging": bench_logging,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EHR Simulator micro-benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--bundle", default=SAMPLE_BUNDLE, help="FHIR bundle JSON used as input")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per measurement (best is reported)")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent requests for DB benchmarks")
+    parser.add_argument("--versions", type=int, default=200, help="Summary versions in the storage benchmark")
+    parser.add_argument("--count", type=int, default=50, help="Patients admitted in the admission benchmark")
+    parser.add_argument("--resources", type=int, default=800, help="Resources in the 1x bundle of the scale benchmark")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per endpoint in the tracing and logging benchmarks")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        endpoint_child(args)
+        return
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
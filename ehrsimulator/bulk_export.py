@@ -0,0 +1,172 @@
+"""
+FHIR Bulk Data ($export) style export of the whole census as NDJSON.
+
+Follows the asynchronous request pattern of the Bulk Data spec:
+- A kick-off request records an export job and returns its status URL.
+- The status URL answers 202 while the job runs, then 200 with a manifest listing one NDJSON file
+  per resource type.
+
+Files are not materialized. Each file is streamed from a server-side cursor when it is downloaded,
+so memory stays flat whatever the census size. The job itself only fixes the transactionTime and,
+when _type is omitted, discovers which resource types exist.
+
+Resource types come from the stored patient bundles: Patient and any other entry type.
+PatientSummary exports every stored summary version.
+
+_since filters on patients.updated_at, bumped on every data change, and on the summary's
+created_at. Bundle resources are therefore re-exported per changed patient, not per changed
+resource. Resources updated after transactionTime may also appear, so chaining exports with
+_since=<previous transactionTime> never misses a change.
+"""
+
+import itertools
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from fhir_query import FHIRQueryError, date_bound, parse_search_params
+from responses import encode_json
+from summary_store import STORAGE_DELTA, decode_delta
+
+SUMMARY_RESOURCE_TYPE = "PatientSummary"
+NDJSON_OUTPUT_FORMATS = {"application/fhir+ndjson", "application/ndjson", "ndjson"}
+MAX_JOBS = 100  # oldest jobs (and their file URLs) are forgotten beyond this
+
+
+class ExportJob:
+    def __init__(self, job_id: str, request_url: str, transaction_time: datetime, types: List[str], since: Optional[str]):
+        self.id = job_id
+        self.request_url = request_url
+        self.transaction_time = transaction_time
+        self.types = types  # empty until discovered when the request had no _type
+        self.since = since
+        self.task = None  # type discovery, when needed
+        self.error: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.task is None or self.task.done()
+
+    def manifest(self, file_url) -> dict:
+        """Bulk Data completion manifest; file_url(resource_type) builds each output URL."""
+        return {
+            "transactionTime": self.transaction_time.isoformat(),
+            "request": self.request_url,
+            "requiresAccessToken": False,
+            "output": [{"type": resource_type, "url": file_url(resource_type)} for resource_type in self.types],
+            "error": [],
+        }
+
+
+class ExportRegistry:
+    """In-memory export jobs, bounded to the MAX_JOBS most recent."""
+
+    def __init__(self, max_jobs: int = MAX_JOBS):
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, ExportJob]" = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def create(self, request_url: str, transaction_time: datetime, types: List[str], since: Optional[str]) -> ExportJob:
+        job_id = f"{transaction_time.strftime('%Y%m%d%H%M%S')}-{next(self._ids)}"
+        job = ExportJob(job_id, request_url, transaction_time, types, since)
+        self.jobs[job_id] = job
+        while len(self.jobs) > self.max_jobs:
+            _, old = self.jobs.popitem(last=False)
+            if old.task is not None:
+                old.task.cancel()
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        return self.jobs.get(job_id)
+
+    def delete(self, job_id: str) -> bool:
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return False
+        if job.task is not None:
+            job.task.cancel()
+        return True
+
+
+def parse_export_params(_type: Optional[str], _since: Optional[str], _outputFormat: Optional[str]) -> Dict:
+    """Validate kick-off parameters; raises FHIRQueryError like the search parameters do."""
+    if _outputFormat and _outputFormat not in NDJSON_OUTPUT_FORMATS:
+        raise FHIRQueryError(f"Unsupported _outputFormat '{_outputFormat}', only application/fhir+ndjson is available")
+    params = parse_search_params(_type=_type, _since=_since)
+    return {"types": list(dict.fromkeys(params["types"])), "since": params["since"]}
+
+
+def _since_condition(column: str, since: Optional[str], bind: Dict) -> str:
+    if not since:
+        return "true"
+    # Parsed like the _search bounds: no offset means UTC, not the server's local time
+    bind["since"] = date_bound(since)
+    return f"{column} > :since"
+
+
+def build_type_discovery_query(since: Optional[str]) -> Tuple:
+    """Resource types present in the bundles of patients changed since `since`, plus PatientSummary if any."""
+    bind: Dict = {}
+    patients = _since_condition("p.updated_at", since, bind)
+    summaries = _since_condition("s.created_at", since, bind)
+    sql = f"""
+        SELECT DISTINCT e.entry->'resource'->>'resourceType' AS resource_type
+        FROM patients p
+        CROSS JOIN LATERAL json_array_elements(p.data->'entry') AS e(entry)
+        WHERE {patients}
+        UNION
+        SELECT '{SUMMARY_RESOURCE_TYPE}' FROM patient_summaries s WHERE {summaries}
+    """
+    return text(sql), bind
+
+
+def build_export_query(resource_type: str, since: Optional[str]) -> Tuple:
+    """
+    Statement streaming one NDJSON file. Bundle resources are returned as JSON text ready to be
+    written as a line; PatientSummary rows carry what summary_line needs to rebuild delta versions.
+    """
+    bind: Dict = {}
+    if resource_type == SUMMARY_RESOURCE_TYPE:
+        # Ordered by the version index, so the cursor streams without a sort
+        sql = f"""
+            SELECT s.id, p.synthea_id, s.patient_id, s.summary_type, s.version, s.is_active, s.created_at,
+                   s.storage_format, s.content, b.content AS base_content, b.changes_highlighted AS base_highlighted
+            FROM patient_summaries s
+            JOIN patients p ON p.id = s.patient_id
+            LEFT JOIN patient_summaries b ON s.storage_format = '{STORAGE_DELTA}' AND b.patient_id = s.patient_id
+                 AND b.summary_type = s.summary_type AND b.version = s.base_version
+            WHERE {_since_condition("s.created_at", since, bind)}
+            ORDER BY s.patient_id, s.summary_type, s.version
+        """
+        return text(sql), bind
+
+    bind["resource_type"] = resource_type
+    sql = f"""
+        SELECT (e.entry->'resource')::text AS line
+        FROM patients p
+        CROSS JOIN LATERAL json_array_elements(p.data->'entry') AS e(entry)
+        WHERE {_since_condition("p.updated_at", since, bind)}
+          AND e.entry->'resource'->>'resourceType' = :resource_type
+        ORDER BY p.id
+    """
+    return text(sql), bind
+
+
+def summary_line(row) -> bytes:
+    """NDJSON line for one summary version, rebuilt from its snapshot when delta-stored."""
+    content = row.content
+    if row.storage_format == STORAGE_DELTA:
+        content, _ = decode_delta(row.base_content, row.base_highlighted, row.content)
+    return encode_json({
+        "resourceType": SUMMARY_RESOURCE_TYPE,
+        "id": str(row.id),
+        "subject": {"reference": f"Patient/{row.synthea_id}"},
+        "patientId": row.patient_id,
+        "summaryType": row.summary_type,
+        "version": row.version,
+        "active": row.is_active,
+        "created": row.created_at,
+        "content": content,
+    })
@@ -0,0 +1,168 @@
+"""
+Single-pass parser for LLM change-tracking markup (~~deleted~~ and **added**).
+
+One scan over the response yields the clean summary, change spans with offsets
+into the clean text, and highlighted HTML built from those offsets, so each
+change is highlighted exactly where it occurred. The parser also accepts the
+response incrementally (e.g. from a streaming LLM call): text is released as
+soon as it can no longer be affected by an open marker.
+"""
+
+import html
+import re
+from typing import Dict, List, Optional
+
+_MARKER_RE = re.compile(r"~~|\*\*")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+MARKERS = {"~~": "deletion", "**": "addition"}
+
+SPAN_STYLES = {
+    "deletion": ('highlight-deleted', "text-decoration: line-through; color: #999;"),
+    "addition": ('highlight-added', "font-weight: bold; color: #28a745;"),
+}
+
+
+class ChangeMarkupParser:
+    """
+    Incremental tokenizer for ~~/** change markup.
+
+    Call feed() with successive chunks and close() at the end; both return the
+    clean text that became final. result() then returns the same structure as
+    process_llm_response_with_changes. Unclosed markers are kept as literal text.
+    """
+
+    def __init__(self):
+        self._pieces: List[str] = []
+        self._length = 0
+        self._flushed = 0
+        self._carry = ""
+        # marker -> (clean offset, piece index) of the currently open span
+        self._open: Dict[str, tuple] = {}
+        self._raw: List[str] = []
+        self._closed = False
+        self.spans: List[Dict] = []
+
+    def _append(self, text: str):
+        if text:
+            self._pieces.append(text)
+            self._length += len(text)
+
+    def _release(self) -> str:
+        limit = min((piece for _, piece in self._open.values()), default=len(self._pieces))
+        released = "".join(self._pieces[self._flushed:limit])
+        self._flushed = max(self._flushed, limit)
+        return released
+
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk of raw LLM output and return newly finalized clean text."""
+        if self._closed:
+            raise ValueError("feed() called after close()")
+        self._raw.append(chunk)
+        if not self._carry and not self._open and "~" not in chunk and "*" not in chunk:
+            # Fast path for the common streaming case: plain text outside any change
+            self._append(chunk)
+            self._flushed = len(self._pieces)
+            return chunk
+        text = self._carry + chunk
+        # A trailing '~' or '*' may be half of a marker completed by the next chunk
+        self._carry = ""
+        last = text[-1:]
+        if last and last in "~*" and (len(text) - len(text.rstrip(last))) % 2:
+            text, self._carry = text[:-1], last
+
+        position = 0
+        for match in _MARKER_RE.finditer(text):
+            self._append(text[position:match.start()])
+            position = match.end()
+            marker = match.group()
+            if marker in self._open:
+                start, _ = self._open.pop(marker)
+                self.spans.append({"type": MARKERS[marker], "start": start, "end": self._length})
+            else:
+                self._open[marker] = (self._length, len(self._pieces))
+        self._append(text[position:])
+        return self._release()
+
+    def close(self) -> str:
+        """Finish parsing; unclosed markers become literal text. Returns the remaining clean text."""
+        if self._closed:
+            return ""
+        self._append(self._carry)
+        self._carry = ""
+        # Re-insert unclosed markers, last first so earlier piece indices stay valid
+        for marker, (offset, piece) in sorted(self._open.items(), key=lambda item: item[1][1], reverse=True):
+            self._pieces.insert(piece, marker)
+            self._length += len(marker)
+            for span in self.spans:
+                if span["start"] >= offset:
+                    span["start"] += len(marker)
+                if span["end"] > offset:
+                    span["end"] += len(marker)
+        self._open.clear()
+        self._closed = True
+        self.spans.sort(key=lambda span: (span["start"], -span["end"]))
+        return self._release()
+
+    @property
+    def clean_text(self) -> str:
+        return "".join(self._pieces)
+
+    def render_html(self, clean_text: Optional[str] = None) -> str:
+        """Highlighted HTML, wrapping each segment of clean text in the spans active over it."""
+        clean_text = self.clean_text if clean_text is None else clean_text
+        boundaries = sorted({0, len(clean_text)} | {s["start"] for s in self.spans} | {s["end"] for s in self.spans})
+        parts = []
+        active: List[Dict] = []
+        next_span = 0
+        for left, right in zip(boundaries, boundaries[1:]):
+            # Sweep: spans are sorted by start, so activation is a single forward pass
+            while next_span < len(self.spans) and self.spans[next_span]["start"] <= left:
+                active.append(self.spans[next_span])
+                next_span += 1
+            active = [span for span in active if span["end"] > left]
+            segment = html.escape(clean_text[left:right])
+            kinds = {span["type"] for span in active}
+            for kind in ("addition", "deletion"):
+                if kind in kinds:
+                    css_class, style = SPAN_STYLES[kind]
+                    segment = f'<span class="{css_class}" style="{style}">{segment}</span>'
+            parts.append(segment)
+        return "".join(parts)
+
+    def result(self, previous_summary: Optional[str] = None) -> Dict:
+        """Clean summary, highlighted HTML and change info for the parsed response."""
+        if not self._closed:
+            self.close()
+        clean_summary = self.clean_text
+        spans = [dict(span, text=clean_summary[span["start"]:span["end"]]) for span in self.spans]
+        deletions = [span["text"] for span in spans if span["type"] == "deletion"]
+        additions = [span["text"] for span in spans if span["type"] == "addition"]
+
+        has_changes = bool(spans)
+        if not has_changes and previous_summary:
+            # Normalize whitespace for comparison
+            normalized_response = _WHITESPACE_RE.sub(" ", clean_summary.strip())
+            normalized_previous = _WHITESPACE_RE.sub(" ", previous_summary.strip())
+            has_changes = normalized_response != normalized_previous
+
+        return {
+            "clean_summary": clean_summary,
+            "highlighted_html": self.render_html(clean_summary),
+            "change_info": {
+                "has_changes": has_changes,
+                "deletion_count": len(deletions),
+                "addition_count": len(additions),
+                "deletions": deletions,
+                "additions": additions,
+            },
+            "change_spans": spans,
+            "raw_response": "".join(self._raw),
+        }
+
+
+def parse_change_markup(llm_response: str, previous_summary: Optional[str] = None) -> Dict:
+    """Parse a complete LLM response in one pass."""
+    parser = ChangeMarkupParser()
+    parser.feed(llm_response)
+    return parser.result(previous_summary)
@@ -0,0 +1,167 @@
+"""
+Clinical significance vocabularies and a compiled single-pass matcher.
+
+Indicator terms are grouped into weighted categories (critical, significant,
+routine by default). A vocabulary compiles all of its terms into one regular
+expression shaped like a trie, with word boundaries, so a text is scanned once
+regardless of vocabulary size. Vocabularies can be loaded from a JSON file
+(CLINICAL_VOCABULARY_PATH) with the same shape as DEFAULT_VOCABULARY.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger("ehrsimulator")
+
+DEFAULT_VOCABULARY = {
+    "critical": {
+        "label": "Critical indicator detected",
+        "weight": 3,
+        "new_only": True,  # only counts when absent from the previous summary
+        "terms": [
+            "critical", "emergent", "urgent", "deteriorating", "unstable",
+            "cardiac arrest", "respiratory failure", "sepsis", "shock",
+            "acute", "severe", "crisis", "emergency",
+        ],
+    },
+    "significant": {
+        "label": "Significant clinical change",
+        "weight": 2,
+        "terms": [
+            "new diagnosis", "medication change", "treatment response",
+            "improved", "worsened", "complication", "adverse reaction",
+            "surgery", "procedure", "admission", "discharge",
+        ],
+    },
+    "routine": {
+        "label": "Routine/stable indicator",
+        "weight": -1,
+        "terms": [
+            "stable", "unchanged", "routine", "maintenance", "follow-up",
+            "regular", "scheduled", "monitoring",
+        ],
+    },
+}
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """
+    Regex source matching any of `terms`, factored as a trie so the regex engine
+    walks shared prefixes once instead of trying every alternative in turn.
+    """
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def render(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            # Greedy optional: prefer the longer term, fall back to the shorter one
+            body = ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+        return body
+
+    return render(trie)
+
+
+class ClinicalVocabulary:
+    """A set of weighted indicator categories compiled into one matcher."""
+
+    def __init__(self, categories: Dict[str, Dict]):
+        self.categories = categories
+        self.term_categories: Dict[str, str] = {}
+        self.term_order: Dict[str, int] = {}
+        for name, category in categories.items():
+            for term in category.get("terms", []):
+                key = term.lower()
+                if key not in self.term_categories:
+                    self.term_categories[key] = name
+                    self.term_order[key] = len(self.term_order)
+        terms = sorted(self.term_categories, key=len, reverse=True)
+        # Terms are lowercased and text is lowercased once per scan, which is
+        # markedly cheaper than re.IGNORECASE folding at every position
+        self.pattern = re.compile(r"\b" + _trie_pattern(terms) + r"\b") if terms else None
+
+    @classmethod
+    def from_file(cls, path: str) -> "ClinicalVocabulary":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.term_categories)
+
+    def scan(self, text: str) -> Dict[str, Dict]:
+        """
+        Find every indicator in text in a single pass.
+        Returns {term: {"category", "count", "positions"}} for terms that occur.
+        """
+        found: Dict[str, Dict] = {}
+        if not text or self.pattern is None:
+            return found
+        for match in self.pattern.finditer(text.lower()):
+            term = match.group()
+            entry = found.get(term)
+            if entry is None:
+                if term not in self.term_categories:
+                    continue
+                entry = found[term] = {"category": self.term_categories[term], "count": 0, "positions": []}
+            entry["count"] += 1
+            entry["positions"].append(match.start())
+        return found
+
+
+_vocabulary: Optional[ClinicalVocabulary] = None
+
+
+def get_vocabulary() -> ClinicalVocabulary:
+    """The active vocabulary: CLINICAL_VOCABULARY_PATH if set, otherwise the defaults."""
+    global _vocabulary
+    if _vocabulary is None:
+        path = os.getenv("CLINICAL_VOCABULARY_PATH")
+        if path:
+            _vocabulary = ClinicalVocabulary.from_file(path)
+            logger.info(f"Loaded clinical vocabulary with {len(_vocabulary)} terms from {path}")
+        else:
+            _vocabulary = ClinicalVocabulary(DEFAULT_VOCABULARY)
+    return _vocabulary
+
+
+def set_vocabulary(vocabulary: Optional[ClinicalVocabulary]):
+    """Replace the active vocabulary (None reloads from the environment on next use)."""
+    global _vocabulary
+    _vocabulary = vocabulary
+
+
+def score_indicators(previous_summary: str, new_data: str, vocabulary: Optional[ClinicalVocabulary] = None) -> Dict:
+    """
+    Weighted indicator score for new data relative to the previous summary.
+    Returns {"score", "notes", "indicators"} where indicators maps each counted
+    term to its category, weight, count and positions in new_data.
+    """
+    vocabulary = vocabulary or get_vocabulary()
+    new_matches = vocabulary.scan(new_data)
+    needs_previous = any(vocabulary.categories[m["category"]].get("new_only") for m in new_matches.values())
+    previous_terms = set(vocabulary.scan(previous_summary)) if needs_previous else set()
+
+    score = 0
+    notes: List[str] = []
+    indicators: Dict[str, Dict] = {}
+    # Report in vocabulary order, like the original per-category keyword lists
+    for term in sorted(new_matches, key=vocabulary.term_order.__getitem__):
+        match = new_matches[term]
+        category = vocabulary.categories[match["category"]]
+        if category.get("new_only") and term in previous_terms:
+            continue
+        score += category["weight"]
+        notes.append(f"{category.get('label', match['category'])}: {term}")
+        indicators[term] = dict(match, weight=category["weight"])
+    return {"score": score, "notes": notes, "indicators": indicators}
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Local fake LLM server for tests and benchmarks that would otherwise need Ollama with 27B models.
+
+Speaks the APIs the simulator calls:
+- Ollama's OpenAI-compatible POST /v1/chat/completions (JSON, or SSE chunks with "stream": true)
+- GET /api/tags
+- Gemini POST /v1beta/models/{model}:generateContent and :streamGenerateContent (?alt=sse)
+
+Output is deterministic for a given --seed, model and prompt. It follows the request:
+- Incremental current-summary prompts get the previous summary back with ~~deleted~~ and
+  **added** change markup.
+- Image (fax) requests get a parsed-document style report.
+- Everything else gets a clinical summary paragraph set.
+
+Timing mimics a local model server:
+- A model is loaded on first use (--load-seconds) and unloaded after --keep-alive idle seconds.
+- At most --concurrency requests generate at once. Up to --max-queue more wait, and beyond that
+  requests get 503 like Ollama's OLLAMA_MAX_QUEUE.
+- Time to first token is --ttft plus the prompt size at --prompt-tokens-per-second.
+- Tokens then arrive at --tokens-per-second.
+- --error-rate fails that fraction of requests with --error-status.
+
+Usage:
+    python fake_llm.py [--port 11434] [--seed N] [--tokens-per-second N] [--ttft S] [--load-seconds S]
+                       [--concurrency N] [--max-queue N] [--error-rate F] [--error-status N]
+
+Point the simulator at it with OLLAMA_URL, OLLAMA_OPENAI_URL, OLLAMA_TAGS_URL and GEMINI_URL.
+GET /stats reports request, error and queue counters.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from timeline import estimate_tokens
+
+DEFAULT_MODELS = ["gemma3:27b", "llama3:8b", "llava:latest", "mistral:latest"]
+GEMINI_MODELS = ["gemini-pro"]  # served on the Gemini routes only, so /api/tags matches a real Ollama
+
+PREVIOUS_SUMMARY_RE = re.compile(r"PREVIOUS CLINICAL SUMMARY:\n(.*?)\n\nNEW PATIENT DATA TO INTEGRATE:", re.S)
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+SUMMARY_SENTENCES = [
+    "The patient has a history of {condition} managed with {medication}.",
+    "Vital signs have remained {trend} over the reporting period, with {vital} most recently within expected limits.",
+    "Recent laboratory results show {lab} {lab_trend}, which should be reviewed at the next encounter.",
+    "There is no evidence of acute decompensation at this time.",
+    "Medication adherence appears adequate and no adverse drug reactions have been documented.",
+    "The care plan focuses on {condition} control, symptom monitoring and patient education.",
+    "Follow-up with primary care is recommended within {weeks} weeks.",
+    "{vital} should continue to be monitored every {hours} hours given the recent trend.",
+    "The patient reports {symptom} but is otherwise comfortable.",
+    "Renal function is stable and electrolytes are within reference ranges.",
+]
+UPDATE_SENTENCES = [
+    "New data shows {vital} {lab_trend} since the previous assessment.",
+    "{medication} was adjusted in response to the latest results.",
+    "The patient now reports {symptom}; nursing staff will reassess in {hours} hours.",
+    "Latest {lab} result is {lab_trend} and warrants closer monitoring.",
+]
+FAX_SENTENCES = [
+    "Document type: laboratory report received by fax.",
+    "Patient identifiers are legible and match the record.",
+    "Results: {lab} {lab_trend}; {vital} recorded at intake.",
+    "Ordering clinician requests follow-up in {weeks} weeks.",
+    "No critical values are flagged on the document.",
+]
+VOCABULARY = {
+    "condition": ["hypertension", "type 2 diabetes", "asthma", "chronic kidney disease", "hyperlipidemia", "anemia"],
+    "medication": ["lisinopril", "metformin", "inhaled fluticasone", "simvastatin", "ferrous sulfate", "amlodipine"],
+    "trend": ["stable", "slightly elevated", "improving", "variable"],
+    "vital": ["Heart rate", "Blood pressure", "Oxygen saturation", "Respiratory rate", "Body temperature"],
+    "lab": ["glucose", "creatinine", "potassium", "hemoglobin", "hemoglobin A1c", "sodium"],
+    "lab_trend": ["trending upward", "trending downward", "unchanged", "mildly above the reference range"],
+    "symptom": ["mild fatigue", "intermittent headache", "improved pain control", "shortness of breath on exertion"],
+    "weeks": ["2", "4", "6"],
+    "hours": ["4", "6", "8"],
+}
+
+
+class FakeLLMError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class FakeLLM:
+    """Deterministic completions with model loading, a concurrency cap and configurable timing."""
+
+    def __init__(self, seed: int = 0, models: Optional[List[str]] = None, load_seconds: float = 0.0,
+                 keep_alive: float = 300.0, ttft: float = 0.05, prompt_tokens_per_second: float = 2000.0,
+                 tokens_per_second: float = 50.0, response_tokens: int = 200, concurrency: int = 1,
+                 max_queue: int = 512, error_rate: float = 0.0, error_status: int = 500):
+        self.seed = seed
+        self.models = models or DEFAULT_MODELS
+        self.load_seconds = load_seconds
+        self.keep_alive = keep_alive
+        self.ttft = ttft
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.max_queue = max_queue
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slots = asyncio.Semaphore(max(concurrency, 1))
+        self.concurrency = max(concurrency, 1)
+        self.waiting = 0
+        self.running = 0
+        self.loaded: Dict[str, float] = {}  # model -> last used (monotonic)
+        self.loading: Dict[str, asyncio.Task] = {}
+        self.stats = Counter()
+        self.failures = random.Random(seed)  # error injection draws, separate from output text
+
+    def _rng(self, model: str, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}\0{model}\0{prompt}".encode("utf-8")).hexdigest()
+        return random.Random(digest)
+
+    def complete_text(self, model: str, prompt: str, image: bool = False) -> str:
+        """The deterministic response text for a prompt."""
+        rng = self._rng(model, prompt)
+        fill = lambda template: template.format(**{key: rng.choice(values) for key, values in VOCABULARY.items()})
+        previous = PREVIOUS_SUMMARY_RE.search(prompt)
+        if previous:
+            sentences = [s for s in SENTENCE_RE.split(previous.group(1).strip()) if s]
+            output = []
+            for sentence in sentences:
+                roll = rng.random()
+                if roll < 0.1:
+                    output.append(f"~~{sentence}~~")
+                elif roll < 0.2:
+                    output.append(f"~~{sentence}~~ **{fill(rng.choice(UPDATE_SENTENCES))}**")
+                else:
+                    output.append(sentence)
+            output.append(f"**{fill(rng.choice(UPDATE_SENTENCES))}**")
+            return " ".join(output)
+        bank = FAX_SENTENCES if image else SUMMARY_SENTENCES
+        sentences = []
+        while estimate_tokens(" ".join(sentences)) < self.response_tokens:
+            sentences.append(fill(rng.choice(bank)))
+        return " ".join(sentences)
+
+    async def _ensure_loaded(self, model: str):
+        last_used = self.loaded.get(model)
+        if last_used is not None and time.monotonic() - last_used <= self.keep_alive:
+            return
+        if model not in self.loading:
+            self.stats["loads"] += 1
+            self.loading[model] = asyncio.create_task(asyncio.sleep(self.load_seconds))
+        try:
+            await asyncio.shield(self.loading[model])
+        finally:
+            self.loading.pop(model, None)
+        self.loaded[model] = time.monotonic()
+
+    async def generate(self, model: str, prompt: str, image: bool = False) -> Tuple[int, AsyncIterator[str]]:
+        """
+        Admits a request and returns (prompt_tokens, pieces). Raises FakeLLMError for unknown models,
+        a full queue and injected failures. The pieces iterator waits for a concurrency slot when first
+        iterated and holds it until exhausted or closed, so a response that is never read holds none.
+        """
+        self.stats["requests"] += 1
+        if model not in self.models and model not in GEMINI_MODELS:
+            self.stats["errors"] += 1
+            raise FakeLLMError(404, f"model '{model}' not found")
+        if self.waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise FakeLLMError(503, "server busy, please try again. maximum pending requests exceeded")
+        if self.failures.random() < self.error_rate:
+            self.stats["errors"] += 1
+            raise FakeLLMError(self.error_status, "injected failure")
+
+        prompt_tokens = estimate_tokens(prompt)
+        text = self.complete_text(model, prompt, image)
+        return prompt_tokens, self._pieces(model, prompt_tokens, text)
+
+    async def _pieces(self, model: str, prompt_tokens: int, text: str) -> AsyncIterator[str]:
+        self.waiting += 1
+        self.stats["peak_waiting"] = max(self.stats["peak_waiting"], self.waiting)
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            await self._ensure_loaded(model)
+            await asyncio.sleep(self.ttft + prompt_tokens / self.prompt_tokens_per_second)
+            started = time.monotonic()
+            words = re.findall(r"\S+\s*", text)
+            for index, word in enumerate(words):
+                # Pace against the start time so sleep overhead does not accumulate
+                delay = started + index / self.tokens_per_second - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield word
+            self.stats["completed"] += 1
+            self.stats["completion_tokens"] += len(words)
+        finally:
+            self.running -= 1
+            self.loaded[model] = time.monotonic()
+            self.slots.release()
+
+    def report(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+            "loaded_models": sorted(self.loaded),
+            **{key: self.stats[key] for key in
+               ("requests", "completed", "errors", "rejected", "loads", "peak_waiting", "completion_tokens")},
+        }
+
+
+def openai_prompt(messages: List[dict]) -> Tuple[str, bool]:
+    """Concatenated message text, and whether any message carries an image."""
+    parts, image = [], False
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                parts.append(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                image = True
+    return "\n\n".join(parts), image
+
+
+def gemini_prompt(contents: List[dict]) -> Tuple[str, bool]:
+    parts, image = [], False
+    for content in contents:
+        for part in content.get("parts", []):
+            if "text" in part:
+                parts.append(part["text"])
+            elif "inline_data" in part or "inlineData" in part:
+                image = True
+    return "\n\n".join(parts), image
+
+
+def create_app(llm: FakeLLM):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+    from responses import encode_json
+
+    app = FastAPI()
+
+    def sse(payload) -> bytes:
+        return b"data: " + (payload if isinstance(payload, bytes) else encode_json(payload)) + b"\n\n"
+
+    @app.exception_handler(FakeLLMError)
+    async def fake_llm_error(request: Request, exc: FakeLLMError):
+        if "/v1beta/" in request.url.path:
+            return JSONResponse(status_code=exc.status, content={"error": {"code": exc.status, "message": str(exc), "status": "UNAVAILABLE" if exc.status == 503 else "INTERNAL"}})
+        return JSONResponse(status_code=exc.status, content={"error": {"message": str(exc), "type": "api_error"}})
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        prompt, image = openai_prompt(body.get("messages", []))
+        prompt_tokens, pieces = await llm.generate(model, prompt, image)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            text = "".join([piece async for piece in pieces])
+            completion_tokens = len(re.findall(r"\S+", text))
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "system_fingerprint": "fp_ollama",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }
+
+        async def events():
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "system_fingerprint": "fp_ollama"}
+            async for piece in pieces:
+                yield sse({**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}]})
+            yield sse({**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": "stop"}]})
+            yield sse(b"[DONE]")
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{
+            "name": model, "model": model, "modified_at": "2025-01-01T00:00:00Z", "size": 0,
+            "digest": hashlib.sha256(model.encode("utf-8")).hexdigest(),
+            "details": {"format": "gguf", "family": model.split(":")[0], "parameter_size": model.partition(":")[2] or "latest"},
+        } for model in llm.models]}
+
+    @app.post("/v1beta/models/{model_action}")
+    async def gemini(model_action: str, request: Request, alt: Optional[str] = None):
+        model, _, action = model_action.partition(":")
+        if action not in ("generateContent", "streamGenerateContent"):
+            return JSONResponse(status_code=404, content={"error": {"code": 404, "message": f"Unknown action '{action}'", "status": "NOT_FOUND"}})
+        body = await request.json()
+        prompt, image = gemini_prompt(body.get("contents", []))
+        prompt_tokens, pieces = await llm.generate(model, prompt, image)
+
+        def candidate(text: str, finished: bool) -> dict:
+            response = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}], "modelVersion": model}
+            if finished:
+                response["candidates"][0]["finishReason"] = "STOP"
+                response["usageMetadata"] = {"promptTokenCount": prompt_tokens}
+            return response
+
+        if action == "generateContent":
+            return candidate("".join([piece async for piece in pieces]), True)
+
+        async def stream():
+            # Gemini streams whole response objects: SSE events with alt=sse, otherwise one JSON array
+            first = True
+            if alt != "sse":
+                yield b"["
+            async for piece in pieces:
+                payload = encode_json(candidate(piece, False))
+                yield sse(payload) if alt == "sse" else (b"" if first else b",\n") + payload
+                first = False
+            payload = encode_json(candidate("", True))
+            yield sse(payload) if alt == "sse" else (b"" if first else b",\n") + payload + b"]"
+
+        return StreamingResponse(stream(), media_type="text/event-stream" if alt == "sse" else "application/json")
+
+    @app.get("/stats")
+    async def stats():
+        return llm.report()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama/OpenAI/Gemini server for tests and benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--seed", type=int, default=0, help="Output seed; same seed and prompt give the same text")
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS), help="Comma-separated model names served")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="Model load time on first use")
+    parser.add_argument("--keep-alive", type=float, default=300.0, help="Idle seconds before a model is unloaded")
+    parser.add_argument("--ttft", type=float, default=0.05, help="Base time to first token, seconds")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=2000.0, help="Prompt processing rate")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Generation rate")
+    parser.add_argument("--response-tokens", type=int, default=200, help="Approximate length of non-incremental responses")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests generating at once (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--max-queue", type=int, default=512, help="Waiting requests before 503 (OLLAMA_MAX_QUEUE)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failed on purpose")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    args = parser.parse_args()
+
+    import uvicorn
+    llm = FakeLLM(
+        seed=args.seed, models=[m.strip() for m in args.models.split(",") if m.strip()],
+        load_seconds=args.load_seconds, keep_alive=args.keep_alive, ttft=args.ttft,
+        prompt_tokens_per_second=args.prompt_tokens_per_second, tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens, concurrency=args.concurrency, max_queue=args.max_queue,
+        error_rate=args.error_rate, error_status=args.error_status,
+    )
+    uvicorn.run(create_app(llm), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+FHIR search-style projection over stored patient bundles.
+
+Builds SQL that unnests a patient's bundle inside Postgres and returns only the
+entries a caller asked for, so large bundles never have to be loaded into Python
+to serve a single resource type.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from sqlalchemy import text
+
+DEFAULT_COUNT = 100
+MAX_COUNT = 1000
+
+# Date elements checked, in order, to place a resource on the patient timeline
+RESOURCE_DATE_PATHS = [
+    ("effectiveDateTime",),
+    ("effectivePeriod", "start"),
+    ("issued",),
+    ("period", "start"),
+    ("onsetDateTime",),
+    ("recordedDate",),
+    ("authoredOn",),
+    ("performedDateTime",),
+    ("performedPeriod", "start"),
+    ("occurrenceDateTime",),
+    ("billablePeriod", "start"),
+    ("date",),
+    ("meta", "lastUpdated"),
+]
+
+_RESOURCE_TYPE_RE = re.compile(r"^[A-Z][A-Za-z]+$")
+_ELEMENT_RE = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+
+class FHIRQueryError(ValueError):
+    """Raised for search parameters that cannot be turned into a query."""
+
+
+def _sql_date_expression(resource: str) -> str:
+    parts = []
+    for path in RESOURCE_DATE_PATHS:
+        if len(path) == 1:
+            parts.append(f"{resource}->>'{path[0]}'")
+        else:
+            parts.append(f"{resource}->'{path[0]}'->>'{path[1]}'")
+    return f"COALESCE({', '.join(parts)})"
+
+
+# Resource dates as timestamptz, so filters compare instants rather than strings. Values without an
+# offset are read as UTC; partial dates (2020, 2020-05) and values Postgres cannot parse (2020-05-01T25:00Z)
+# become NULL, so one malformed resource cannot fail a search. Created at startup (see SCHEMA_MIGRATIONS).
+TIMESTAMP_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION fhir_timestamptz(value text) RETURNS timestamptz
+LANGUAGE plpgsql STABLE PARALLEL SAFE AS $$
+BEGIN
+    IF value ~ '^\d{4}-\d{2}-\d{2}[T ].*(Z|[+-]\d{2}:?\d{2})$' THEN
+        RETURN value::timestamptz;
+    ELSIF value ~ '^\d{4}-\d{2}-\d{2}' THEN
+        RETURN value::timestamp AT TIME ZONE 'UTC';
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN data_exception THEN
+    RETURN NULL;
+END
+$$
+"""
+
+
+def _sql_timestamp(date_expr: str) -> str:
+    return f"fhir_timestamptz({date_expr})"
+
+
+def _is_date_only(value: str) -> bool:
+    return len(value) == 10
+
+
+def date_bound(value: str, end_of_day: bool = False) -> datetime:
+    """
+    A _since/_until value as an aware datetime (UTC when it has no offset). A date-only value
+    with `end_of_day` becomes the start of the next day, for an exclusive upper bound.
+    """
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end_of_day and _is_date_only(value):
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def resource_date(resource: dict) -> Optional[str]:
+    """Python counterpart of the SQL date expression, used for in-memory bundles."""
+    for path in RESOURCE_DATE_PATHS:
+        value = resource
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value:
+            return value
+    return None
+
+
+def _split_csv(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _parse_date(name: str, value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise FHIRQueryError(f"Invalid {name} value '{value}', expected an ISO 8601 date or dateTime")
+    return value
+
+
+def parse_search_params(
+    _type: Optional[str] = None,
+    _since: Optional[str] = None,
+    _until: Optional[str] = None,
+    _count: Optional[int] = None,
+    _offset: Optional[int] = None,
+    _elements: Optional[str] = None,
+) -> Dict:
+    """Validate raw query parameters and normalize them for build_resource_query."""
+    types = _split_csv(_type)
+    for resource_type in types:
+        if not _RESOURCE_TYPE_RE.match(resource_type):
+            raise FHIRQueryError(f"Invalid _type value '{resource_type}'")
+
+    elements = _split_csv(_elements)
+    for element in elements:
+        if not _ELEMENT_RE.match(element):
+            raise FHIRQueryError(f"Invalid _elements value '{element}'")
+
+    count = DEFAULT_COUNT if _count is None else _count
+    if count < 0:
+        raise FHIRQueryError("_count must not be negative")
+    offset = _offset or 0
+    if offset < 0:
+        raise FHIRQueryError("_offset must not be negative")
+
+    return {
+        "types": types,
+        "since": _parse_date("_since", _since),
+        "until": _parse_date("_until", _until),
+        "count": min(count, MAX_COUNT),
+        "offset": offset,
+        "elements": elements,
+    }
+
+
+def build_resource_query(patient_id: int, params: Dict) -> Tuple:
+    """
+    Build the SQL statement returning one page of bundle entries for a patient.
+
+    Entries are unnested with json_array_elements so filtering, paging and
+    _elements projection all happen in the database. Each row carries the entry
+    as JSON text (NULL for an empty page) plus the total match count for the
+    searchset bundle.
+    """
+    resource = "e.entry->'resource'"
+    date_expr = _sql_timestamp(_sql_date_expression(resource))
+    conditions = ["p.id = :patient_id"]
+    bind = {"patient_id": patient_id, "limit": params["count"], "offset": params["offset"]}
+
+    if params["types"]:
+        conditions.append(f"{resource}->>'resourceType' = ANY(:types)")
+        bind["types"] = params["types"]
+    if params["since"]:
+        conditions.append(f"{date_expr} >= :since")
+        bind["since"] = date_bound(params["since"])
+    if params["until"]:
+        # A date-only _until includes the whole of that day
+        conditions.append(f"{date_expr} {'<' if _is_date_only(params['until']) else '<='} :until")
+        bind["until"] = date_bound(params["until"], end_of_day=True)
+
+    if params["elements"]:
+        # FHIR _elements always keeps the mandatory resourceType and id
+        bind["elements"] = sorted(set(params["elements"]) | {"resourceType", "id"})
+        projected = (
+            "json_build_object('fullUrl', e.entry->'fullUrl', 'resource', "
+            f"(SELECT json_object_agg(r.key, r.value) FROM json_each({resource}) AS r "
+            "WHERE r.key = ANY(:elements)))"
+        )
+    else:
+        projected = "e.entry"
+
+    # The single-row outer select keeps the total available even for empty pages
+    sql = f"""
+        WITH matches AS (
+            SELECT e.entry, e.idx
+            FROM patients p
+            CROSS JOIN LATERAL json_array_elements(p.data->'entry') WITH ORDINALITY AS e(entry, idx)
+            WHERE {' AND '.join(conditions)}
+        ),
+        page AS (
+            SELECT ({projected})::text AS entry, e.idx
+            FROM matches e
+            ORDER BY e.idx
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT page.entry, (SELECT count(*) FROM matches) AS total
+        FROM (SELECT 1) AS one
+        LEFT JOIN page ON true
+        ORDER BY page.idx
+    """
+    return text(sql), bind
+
+
+def build_search_links(base_url: str, params: Dict, total: int) -> List[Dict]:
+    """Build FHIR Bundle.link entries (self/next/previous) for offset paging."""
+
+    def page_url(offset: int) -> str:
+        query = {"_count": params["count"], "_offset": offset}
+        if params["types"]:
+            query["_type"] = ",".join(params["types"])
+        if params["since"]:
+            query["_since"] = params["since"]
+        if params["until"]:
+            query["_until"] = params["until"]
+        if params["elements"]:
+            query["_elements"] = ",".join(params["elements"])
+        return f"{base_url}?{urlencode(query, safe=',:')}"
+
+    links = [{"relation": "self", "url": page_url(params["offset"])}]
+    if params["count"] and params["offset"] + params["count"] < total:
+        links.append({"relation": "next", "url": page_url(params["offset"] + params["count"])})
+    if params["offset"] > 0:
+        links.append({"relation": "previous", "url": page_url(max(params["offset"] - params["count"], 0))})
+    return links
@@ -0,0 +1,160 @@
+"""
+Record and replay of LLM calls, so prompt building and response post-processing can be
+benchmarked and regression-tested without running inference.
+
+LLM_RECORD_MODE=record appends these records to a JSONL file:
+- one "llm" record per call_llm request: its inputs, response, timing and token counts.
+- one "summary" record per generated summary: the pipeline inputs (patient, version, previous
+  summary) and the response body.
+- one "bundle" record the first time each patient version is summarized, so the pipeline can be
+  re-run offline.
+
+LLM_RECORD_MODE=replay answers call_llm from the recording instead of the model:
+- Requests are matched by a hash of the call_llm arguments. Changes to build_prompts or to
+  post-processing therefore still replay.
+- A request whose inputs changed (e.g. get_fhir_stats output) is a miss. It returns an LLM error.
+- Replayed calls still build their prompts. A prompt that no longer hashes like the recorded one
+  is counted as prompt drift.
+- Repeated identical requests replay their recordings in order.
+
+replay_llm.py re-runs a recording's summaries through the pipeline and reports CPU cost and drift.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+
+from responses import encode_json
+from timeline import estimate_tokens
+
+logger = logging.getLogger("ehrsimulator")
+
+RECORD = "record"
+REPLAY = "replay"
+RECORD_MODES = ("off", RECORD, REPLAY)
+REPLAY_MISS_MESSAGE = "Error: No response recorded for this request"  # matches an LLM_ERROR_PREFIXES entry
+
+_HASH_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+
+def request_key(model: str, summary_type: str, prompt_text: str, previous_summary: Optional[str], numeric_signals: Optional[dict]) -> str:
+    """Replay key of a call_llm request."""
+    payload = orjson.dumps([model, summary_type, prompt_text, previous_summary, numeric_signals], option=_HASH_OPTIONS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+def prompt_fingerprint(system_prompt: str, full_prompt: str) -> str:
+    return hashlib.sha256(f"{system_prompt}\0{full_prompt}".encode("utf-8")).hexdigest()
+
+
+def read_recording(path: str, kinds: Tuple[str, ...] = ("llm", "summary", "bundle")) -> Iterator[dict]:
+    """Records of the given kinds, in file order. Lines of other kinds are skipped without being parsed."""
+    prefixes = tuple(b'{"kind":"%s"' % kind.encode("ascii") for kind in kinds)
+    with open(path, "rb") as f:
+        for line in f:
+            if line.startswith(prefixes):
+                yield orjson.loads(line)
+
+
+class LLMRecorder:
+    """Appends LLM calls and summaries to a recording, or serves calls back from one."""
+
+    def __init__(self, mode: str, path: str, replay_speed: float = 0.0):
+        self.mode = mode
+        self.path = path
+        self.replay_speed = replay_speed  # replayed calls take recorded latency / speed; 0 answers at once
+        self.stats = Counter()
+        self._file = None
+        self._bundles_written = set()
+        self._recordings: Dict[str, List[dict]] = defaultdict(list)
+        self._served: Counter = Counter()
+        if mode == REPLAY:
+            for record in read_recording(path, ("llm",)):
+                self._recordings[record["key"]].append(record)
+            logger.info(f"Loaded {sum(len(r) for r in self._recordings.values())} recorded LLM calls from {path}")
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    def _write(self, record: dict):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(encode_json(record) + b"\n")
+        self._file.flush()
+
+    async def call(self, call: Callable[[], Awaitable[str]], model: str, summary_type: str, prompt_text: str,
+                   previous_summary: Optional[str], numeric_signals: Optional[dict], prompt_hash: str) -> str:
+        """Runs `call` (the real LLM request) when recording; answers from the recording when replaying."""
+        key = request_key(model, summary_type, prompt_text, previous_summary, numeric_signals)
+        if self.mode == REPLAY:
+            return await self._replay(key, prompt_hash)
+
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        response = await call()
+        duration = time.perf_counter() - start
+        self._write({
+            "kind": "llm",
+            "key": key,
+            "at": started_at,
+            "model": model,
+            "summary_type": summary_type,
+            "prompt_hash": prompt_hash,
+            "prompt_text": prompt_text,
+            "previous_summary": previous_summary,
+            "numeric_signals": numeric_signals,
+            "response": response,
+            "duration_seconds": round(duration, 4),
+            # Estimated like the token budgets elsewhere; providers count differently
+            "prompt_tokens": estimate_tokens(prompt_text) + estimate_tokens(previous_summary or ""),
+            "completion_tokens": estimate_tokens(response),
+        })
+        self.stats["recorded"] += 1
+        return response
+
+    async def _replay(self, key: str, prompt_hash: str) -> str:
+        recordings = self._recordings.get(key)
+        if not recordings:
+            self.stats["misses"] += 1
+            logger.warning(f"No recorded LLM response for request {key[:12]}")
+            return REPLAY_MISS_MESSAGE
+        # Identical requests replay their recordings in order, then keep returning the last one
+        record = recordings[min(self._served[key], len(recordings) - 1)]
+        self._served[key] += 1
+        self.stats["hits"] += 1
+        if record["prompt_hash"] != prompt_hash:
+            self.stats["prompt_drift"] += 1
+        if self.replay_speed > 0:
+            await asyncio.sleep(record["duration_seconds"] / self.replay_speed)
+        return record["response"]
+
+    def record_summary(self, patient, summary_type: str, model: str, strategy: str, escalate: bool,
+                       previous_summary: Optional[str], previous_created_at: Optional[datetime], output: dict):
+        """Records one generated summary, with the patient's bundle the first time its version is seen."""
+        if (patient.id, patient.version) not in self._bundles_written:
+            self._write({"kind": "bundle", "patient_id": patient.id, "version": patient.version, "data": patient.data})
+            self._bundles_written.add((patient.id, patient.version))
+        self._write({
+            "kind": "summary",
+            "at": datetime.now(timezone.utc),
+            "patient_id": patient.id,
+            "patient_version": patient.version,
+            "summary_type": summary_type,
+            "model": model,
+            "strategy": strategy,
+            "escalate": escalate,
+            "previous_summary": previous_summary,
+            "previous_created_at": previous_created_at,
+            "output": output,
+        })
+        self.stats["summaries"] += 1
+
+    def report(self) -> dict:
+        return {"mode": self.mode, "path": self.path, **self.stats}
@@ -0,0 +1,169 @@
+"""
+Prioritized LLM concurrency and deduplication of in-flight summary jobs.
+
+PrioritySemaphore bounds concurrent LLM calls like asyncio.Semaphore. When a
+slot frees up it goes to the waiter with the best (lowest) priority level
+rather than the longest-waiting one, so background work (speculative summaries,
+drafts) only runs on capacity that clinicians are not waiting for. The level is
+taken from the `current_priority` context variable at acquire time. Each
+asyncio task gets its own copy of the context, so background tasks set it once
+(see run_with_priority).
+
+JobRegistry runs at most one job per key. A request for a key that is already
+running, or that was precomputed and retained, awaits that result instead of
+starting a duplicate. Awaiting a background job raises it to interactive
+priority.
+"""
+
+import asyncio
+import itertools
+import logging
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger("ehrsimulator")
+
+INTERACTIVE = 0
+BACKGROUND = 10
+
+
+class Priority:
+    """Mutable priority level shared by every LLM call of one job, so the job can be boosted."""
+
+    def __init__(self, level: int = INTERACTIVE):
+        self.level = level
+
+
+current_priority: ContextVar[Priority] = ContextVar("llm_priority", default=Priority(INTERACTIVE))
+
+
+async def run_with_priority(priority: Priority, awaitable: Awaitable) -> Any:
+    """Awaits `awaitable` with LLM calls at `priority`; meant as the body of a new task."""
+    current_priority.set(priority)
+    return await awaitable
+
+
+class PrioritySemaphore:
+    """asyncio.Semaphore that hands freed slots to the highest-priority waiter (FIFO within a level)."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[Tuple[Priority, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    async def acquire(self):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return True
+        waiter = (current_priority.get(), next(self._order), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await waiter[2]
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter[2].done() and not waiter[2].cancelled():
+                # A slot was handed over just as the waiter was cancelled; pass it on
+                self.release()
+            raise
+        return True
+
+    def release(self):
+        while self._waiters:
+            # Levels can change while waiting (boosts), so pick at release time
+            waiter = min(self._waiters, key=lambda w: (w[0].level, w[1]))
+            self._waiters.remove(waiter)
+            if not waiter[2].done():
+                waiter[2].set_result(None)
+                return
+        self._value += 1
+
+    def waiting(self) -> Dict[int, int]:
+        """Number of waiters per priority level."""
+        return dict(Counter(priority.level for priority, _, _ in self._waiters))
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class Job:
+    def __init__(self, task: asyncio.Task, priority: Priority, retain: bool):
+        self.task = task
+        self.priority = priority
+        self.retain = retain  # keep the result after completion until it is served
+
+
+class JobRegistry:
+    """At most one job per key; callers for a running or retained key share its result."""
+
+    def __init__(self, max_retained: int = 256):
+        self.max_retained = max_retained
+        self.jobs: "OrderedDict[Hashable, Job]" = OrderedDict()
+        self.stats = Counter()
+
+    def start(self, key: Hashable, factory: Callable[[], Awaitable], level: int = INTERACTIVE, retain: bool = False) -> Job:
+        """Starts `factory()` as a task under `key` unless a job for the key already exists."""
+        job = self.jobs.get(key)
+        if job is not None and not (job.task.done() and (job.task.cancelled() or job.task.exception() is not None)):
+            return job
+        priority = Priority(level)
+        job = Job(asyncio.create_task(run_with_priority(priority, factory())), priority, retain)
+        self.jobs[key] = job
+        self.stats["background_started" if level > INTERACTIVE else "started"] += 1
+        job.task.add_done_callback(lambda task: self._finished(key, job))
+        return job
+
+    def _finished(self, key: Hashable, job: Job):
+        failed = job.task.cancelled() or job.task.exception() is not None
+        if failed:
+            self.stats["failed"] += 1
+            if not job.task.cancelled():
+                logger.warning(f"Job {key} failed: {job.task.exception()}")
+        if (failed or not job.retain) and self.jobs.get(key) is job:
+            del self.jobs[key]
+            return
+        self.jobs.move_to_end(key)
+        retained = [k for k, j in self.jobs.items() if j.task.done()]
+        for old in retained[:max(len(retained) - self.max_retained, 0)]:
+            del self.jobs[old]
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable]) -> Tuple[Any, Optional[dict]]:
+        """
+        Result for `key`: shared from an existing job when there is one, otherwise from a new
+        interactive job. Returns (result, None) or (result, {"background", "in_progress"}) when shared.
+        Cancelling the caller does not cancel a job others may be waiting on.
+        """
+        job = self.jobs.get(key)
+        if job is not None:
+            shared = {"background": job.priority.level > INTERACTIVE, "in_progress": not job.task.done()}
+            job.priority.level = min(job.priority.level, INTERACTIVE)
+            try:
+                result = await asyncio.shield(job.task)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # already logged by _finished; run it again below
+            else:
+                self.stats["shared"] += 1
+                if job.retain and self.jobs.get(key) is job:
+                    del self.jobs[key]  # a retained result is served once
+                return result, shared
+        job = self.start(key, factory)
+        return await asyncio.shield(job.task), None
+
+    def report(self) -> dict:
+        return {
+            "running": sum(1 for job in self.jobs.values() if not job.task.done()),
+            "retained": sum(1 for job in self.jobs.values() if job.task.done()),
+            **{key: self.stats[key] for key in ("started", "background_started", "shared", "failed")},
+        }
+
+    async def shutdown(self):
+        tasks = [job.task for job in self.jobs.values() if not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,150 @@
+"""
+Logging configuration for EHR Simulator, read from the environment.
+
+Records are queued by the thread that logs them and written by a QueueListener thread, so
+console and file I/O stay off the event loop. The logging thread only merges the message
+arguments. Formatting and writing both happen on the listener thread.
+
+- LOG_LEVEL: root level (default INFO).
+- LOG_LEVELS: per-logger levels, e.g. "ehrsimulator.llm=DEBUG,sqlalchemy.engine=INFO". These
+  override the defaults below. sqlalchemy.engine at INFO logs every SQL statement with its
+  parameters, as echo=True used to.
+- LOG_FORMAT: text (default) or json. json writes one object per line, with trace and span ids
+  when logging instrumentation is on.
+- LOG_FILE: log file (default ehrsimulator.log, empty for console only). Rotated at
+  LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT old files.
+- LOG_QUEUE=off: write on the logging thread instead, e.g. to keep output ordered with print().
+"""
+
+import atexit
+import copy
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+import orjson
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+FORMATS = ("text", "json")
+
+# Verbose by design, so quiet unless LOG_LEVELS asks for them
+DEFAULT_LEVELS = {
+    "sqlalchemy.engine": "WARNING",
+}
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+if LOG_FORMAT not in FORMATS:
+    raise ValueError(f"LOG_FORMAT must be one of {FORMATS}, got '{LOG_FORMAT}'")
+LOG_FILE = os.getenv("LOG_FILE", "ehrsimulator.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE = os.getenv("LOG_QUEUE", "on").lower() in ("1", "on", "true", "yes")
+
+_listener: Optional[QueueListener] = None
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """'name=LEVEL,name=LEVEL' into {name: LEVEL}."""
+    levels = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, sep, level = item.partition("=")
+        level = level.strip().upper()
+        if not sep or not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"LOG_LEVELS entries must look like 'logger=LEVEL', got '{item.strip()}'")
+        levels[name.strip()] = level
+    return levels
+
+
+LOGGER_LEVELS = {**DEFAULT_LEVELS, **parse_levels(os.getenv("LOG_LEVELS", ""))}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        # Set by LoggingInstrumentor; "0" outside a span
+        trace_id = getattr(record, "otelTraceID", "0")
+        if trace_id != "0":
+            entry["trace_id"] = trace_id
+            entry["span_id"] = record.otelSpanID
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry).decode("utf-8")
+
+
+class DeferredFormatQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener. The stock prepare() formats the record
+    on the logging thread.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments may change after the call returns, and exc_info holds frames, so resolve both here
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _handlers() -> list:
+    formatter = JSONFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.append(RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def setup_logging():
+    """
+    Configures the root logger and the per-logger levels. Like logging.basicConfig, leaves the
+    handlers alone when the root logger already has some.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for name, level in LOGGER_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+    if root.handlers:
+        return
+    if not LOG_QUEUE:
+        for handler in _handlers():
+            root.addHandler(handler)
+        return
+    records = queue.SimpleQueue()
+    root.addHandler(DeferredFormatQueueHandler(records))
+    _listener = QueueListener(records, *_handlers(), respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Writes out queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
@@ -0,0 +1,151 @@
+"""
+Prometheus metrics for EHR Simulator. Instruments use the OpenTelemetry metrics API; a
+PrometheusMetricReader serves them at GET /metrics.
+
+Labels come from small fixed sets, so the number of series stays constant as traffic grows:
+- endpoint: the route template (/patients/{patient_id}), never the raw path; "other" when no
+  route matched.
+- model, summary_type: checked against the known values with bounded(); user input outside
+  them becomes "other".
+- status: the HTTP status code for requests, "ok"/"error" for LLM calls and faxes.
+
+The meter provider is private to this module, so instrumentation libraries do not add their own
+(possibly unbounded) series. METRICS_ENABLED=off makes every instrument a no-op and /metrics 404.
+"""
+
+import logging
+import os
+import time
+from typing import AsyncIterator, Callable, Iterable, Tuple, TypeVar
+
+from opentelemetry.metrics import NoOpMeter, Observation
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.resources import Resource
+
+logger = logging.getLogger("ehrsimulator")
+
+T = TypeVar("T")
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "on").lower() in ("1", "on", "true", "yes")
+OTHER = "other"
+HTTP_METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+
+# Seconds; from a cached response to a large-model summary
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+if METRICS_ENABLED:
+    from opentelemetry.exporter.prometheus import PrometheusMetricReader
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+    _provider = MeterProvider(
+        # One instrumentation scope, so the otel_scope_* labels would only repeat themselves
+        metric_readers=[PrometheusMetricReader(scope_info_enabled=False)],
+        resource=Resource.create({"service.name": "ehr-simulator", "service.version": "1.0.0"}),
+    )
+    meter = _provider.get_meter("ehrsimulator")
+else:
+    meter = NoOpMeter("ehrsimulator")
+
+# --- Instruments ---
+http_request_duration = meter.create_histogram(
+    "ehr.http.server.duration", unit="s", description="HTTP request duration, including streamed bodies",
+    explicit_bucket_boundaries_advisory=DURATION_BUCKETS,
+)
+active_streams = meter.create_up_down_counter(
+    "ehr.streams.active", unit="{stream}",
+    description="Open response streams (NDJSON bulk admission and $export files, SSE patient event subscribers)",
+)
+summary_duration = meter.create_histogram(
+    "ehr.summary.duration", unit="s", description="POST /summarize duration by how the summary was produced",
+    explicit_bucket_boundaries_advisory=DURATION_BUCKETS,
+)
+llm_request_duration = meter.create_histogram(
+    "ehr.llm.request.duration", unit="s", description="LLM call duration, after waiting for a concurrency slot",
+    explicit_bucket_boundaries_advisory=DURATION_BUCKETS,
+)
+llm_queue_wait = meter.create_histogram(
+    "ehr.llm.queue.wait", unit="s", description="Time LLM calls waited for a concurrency slot",
+    explicit_bucket_boundaries_advisory=DURATION_BUCKETS,
+)
+llm_active_requests = meter.create_up_down_counter(
+    "ehr.llm.active_requests", unit="{request}", description="LLM calls holding a concurrency slot",
+)
+llm_tokens = meter.create_counter(
+    "ehr.llm.tokens", unit="{token}", description="Estimated prompt and completion tokens (rate() gives tokens/sec)",
+)
+patients_admitted = meter.create_counter(
+    "ehr.patients.admitted", unit="{patient}", description="Admitted patients by bundle source",
+)
+fax_duration = meter.create_histogram(
+    "ehr.fax.duration", unit="s", description="Fax upload processing duration, including the vision model call",
+    explicit_bucket_boundaries_advisory=DURATION_BUCKETS,
+)
+
+
+def bounded(value, allowed) -> str:
+    """`value` when it is one of `allowed`, else "other", so request input cannot add series."""
+    return value if value in allowed else OTHER
+
+
+def observe(name: str, callback: Callable[[], Iterable[Tuple[float, dict]]], description: str = "", unit: str = "1"):
+    """Gauge read at scrape time; `callback` returns (value, labels) pairs."""
+
+    def observations(options):
+        try:
+            return [Observation(value, labels) for value, labels in callback()]
+        except Exception as e:
+            logger.warning(f"Metric {name} could not be observed: {e}")
+            return []
+
+    meter.create_observable_gauge(name, callbacks=[observations], description=description, unit=unit)
+
+
+async def counted_stream(endpoint: str, chunks: AsyncIterator[T]) -> AsyncIterator[T]:
+    """Passes `chunks` (body bytes or SSE events) through, counted in ehr.streams.active while the stream is open."""
+    labels = {"endpoint": endpoint}
+    active_streams.add(1, labels)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        active_streams.add(-1, labels)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Current values in the Prometheus text format, and its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the duration of every HTTP request per route template. One
+    measurement per request: each costs ~10us in the SDK, so there is no in-progress counter here
+    (long-running streams have ehr.streams.active).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope it was given
+            route = scope.get("route")
+            http_request_duration.record(time.perf_counter() - start, {
+                "endpoint": getattr(route, "path", OTHER),
+                "method": bounded(scope["method"], HTTP_METHODS),
+                "status": str(status),
+            })
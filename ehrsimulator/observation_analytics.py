@@ -0,0 +1,480 @@
+"""
+Vectorized analytics over a patient's numeric Observation history.
+
+A bundle is flattened once into columnar NumPy arrays (code index, time, value),
+with blood pressure panels split into their systolic/diastolic components and
+simulator vitals updates mapped onto the same LOINC codes. Per-code statistics
+(baseline mean and spread, z-score of the latest value, trailing slope,
+reference-range crossings) are then computed for every code at once with
+grouped reductions, so scoring a patient costs a handful of array passes rather
+than a Python loop per observation. Flattened tables are cached per
+(patient_id, version), which changes whenever the bundle does.
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("ehrsimulator")
+
+# LOINC code -> (display name, low, high, unit) used when an Observation carries no referenceRange
+REFERENCE_RANGES = {
+    "8867-4": ("Heart rate", 60.0, 100.0, "/min"),
+    "9279-1": ("Respiratory rate", 12.0, 20.0, "/min"),
+    "8480-6": ("Systolic blood pressure", 90.0, 140.0, "mm[Hg]"),
+    "8462-4": ("Diastolic blood pressure", 60.0, 90.0, "mm[Hg]"),
+    "8310-5": ("Body temperature", 36.1, 37.8, "Cel"),
+    "59408-5": ("Oxygen saturation", 94.0, 100.0, "%"),
+    "2708-6": ("Oxygen saturation", 94.0, 100.0, "%"),
+    "72514-3": ("Pain severity", 0.0, 3.0, "{score}"),
+    "2339-0": ("Glucose", 70.0, 140.0, "mg/dL"),
+    "4548-4": ("Hemoglobin A1c", 4.0, 5.7, "%"),
+    "6299-2": ("Urea nitrogen", 7.0, 20.0, "mg/dL"),
+    "38483-4": ("Creatinine", 0.6, 1.3, "mg/dL"),
+    "49765-1": ("Calcium", 8.5, 10.5, "mg/dL"),
+    "2947-0": ("Sodium", 135.0, 145.0, "mmol/L"),
+    "6298-4": ("Potassium", 3.5, 5.1, "mmol/L"),
+    "2069-3": ("Chloride", 98.0, 107.0, "mmol/L"),
+    "20565-8": ("Carbon dioxide", 22.0, 29.0, "mmol/L"),
+    "6690-2": ("Leukocytes", 4.5, 11.0, "10*3/uL"),
+    "718-7": ("Hemoglobin", 12.0, 17.5, "g/dL"),
+    "777-3": ("Platelets", 150.0, 400.0, "10*3/uL"),
+}
+
+# Simulator update vitals (see simulate_patient_update_async) -> LOINC
+SIMULATED_VITAL_CODES = {
+    "heart_rate": "8867-4",
+    "respiratory_rate": "9279-1",
+    "temperature": "8310-5",
+}
+BLOOD_PRESSURE_CODES = ("8480-6", "8462-4")  # systolic, diastolic
+
+VITAL_SIGNS = "vital-signs"
+LABORATORY = "laboratory"
+OTHER_CATEGORY = "other"
+CATEGORY_ORDER = {VITAL_SIGNS: 0, LABORATORY: 1}
+TRENDS = {1: "rising", -1: "falling", 0: "stable"}
+
+# Points added to the clinical significance score per numeric signal
+NUMERIC_SIGNAL_WEIGHTS = {
+    "range_exit": 3,     # latest value left the reference range
+    "range_return": 2,   # latest value came back into range
+    "z_critical": 3,     # |z| >= Z_CRITICAL against the baseline
+    "z_significant": 2,  # |z| >= Z_SIGNIFICANT against the baseline
+}
+Z_SIGNIFICANT = 2.0
+Z_CRITICAL = 3.0
+MIN_BASELINE = 3     # baseline observations needed before a z-score is trusted
+SLOPE_WINDOW = 10    # trailing observations per code used for the slope signal
+TREND_WINDOW = 5     # trailing observations per code behind the summary trend label
+STD_FLOOR = 1e-9     # spreads below this fraction of |mean| are rounding noise, treated as zero
+
+CACHE_SIZE = max(int(os.getenv("OBSERVATION_CACHE_SIZE", "256")), 1)
+
+_SECONDS_PER_DAY = 86400.0
+
+
+def _epoch_seconds(value) -> Optional[float]:
+    """ISO-8601 string or datetime -> POSIX seconds; naive values are taken as UTC."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class ObservationTable:
+    """Columnar numeric observations for one patient, sorted by (code, time)."""
+
+    def __init__(self, codes: List[str], displays: List[str], units: List[str], categories: List[str],
+                 ref_low: List[float], ref_high: List[float],
+                 code_index: np.ndarray, times: np.ndarray, values: np.ndarray):
+        order = np.lexsort((times, code_index))
+        self.codes = codes
+        self.displays = displays
+        self.units = units
+        self.categories = categories
+        self.ref_low = np.asarray(ref_low, dtype=np.float64)
+        self.ref_high = np.asarray(ref_high, dtype=np.float64)
+        self.code_index = code_index[order]
+        self.times = times[order]
+        self.values = values[order]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def from_bundle(cls, bundle: dict) -> "ObservationTable":
+        """Flatten numeric Observations (and simulator vitals updates) in one pass."""
+        code_ids: Dict[str, int] = {}
+        codes: List[str] = []
+        displays: List[str] = []
+        units: List[str] = []
+        categories: List[str] = []
+        ref_low: List[float] = []
+        ref_high: List[float] = []
+        index_col: List[int] = []
+        time_col: List[float] = []
+        value_col: List[float] = []
+        parsed_times: Dict[str, Optional[float]] = {}
+
+        def code_id(code: str, display: Optional[str], unit: Optional[str], category: str, reference: Optional[dict]) -> int:
+            cid = code_ids.get(code)
+            if cid is None:
+                default = REFERENCE_RANGES.get(code)
+                cid = code_ids[code] = len(codes)
+                codes.append(code)
+                displays.append((default[0] if default else None) or display or code)
+                units.append(unit or (default[3] if default else ""))
+                categories.append(category)
+                ref_low.append(default[1] if default else np.nan)
+                ref_high.append(default[2] if default else np.nan)
+            if reference:
+                # An explicit referenceRange on the resource wins over the defaults
+                low, high = reference.get("low", {}).get("value"), reference.get("high", {}).get("value")
+                if low is not None:
+                    ref_low[cid] = float(low)
+                if high is not None:
+                    ref_high[cid] = float(high)
+            return cid
+
+        def add(code: str, display, unit, category, reference, when: float, value):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                index_col.append(code_id(code, display, unit, category, reference))
+                time_col.append(when)
+                value_col.append(float(value))
+
+        for entry in (bundle or {}).get("entry", []):
+            resource = entry.get("resource") or {}
+            if resource.get("resourceType") != "Observation":
+                continue
+            stamp = resource.get("effectiveDateTime") or resource.get("issued")
+            if stamp not in parsed_times:
+                # Panels and same-encounter labs share timestamps; parse each string once
+                parsed_times[stamp] = _epoch_seconds(stamp)
+            when = parsed_times[stamp]
+            if when is None:
+                continue
+            reference = (resource.get("referenceRange") or [None])[0]
+            category = observation_category(resource)
+            quantity = resource.get("valueQuantity")
+            if quantity:
+                code = resource.get("code") or {}
+                coding = (code.get("coding") or [{}])[0]
+                display = code.get("text") or coding.get("display") or (None if coding.get("code") else "Unknown observation")
+                add(coding.get("code", "unknown"), display, quantity.get("unit"), category, reference, when, quantity.get("value"))
+            for component in resource.get("component") or []:
+                quantity = component.get("valueQuantity")
+                if quantity:
+                    coding = ((component.get("code") or {}).get("coding") or [{}])[0]
+                    add(coding.get("code", "unknown"), coding.get("display"), quantity.get("unit"), category,
+                        (component.get("referenceRange") or [None])[0], when, quantity.get("value"))
+
+        for update in (bundle or {}).get("updates", []):
+            when = _epoch_seconds(update.get("timestamp"))
+            vitals = update.get("vitals") or {}
+            if when is None:
+                continue
+            for name, code in SIMULATED_VITAL_CODES.items():
+                add(code, None, None, VITAL_SIGNS, None, when, vitals.get(name))
+            pressure = vitals.get("blood_pressure")
+            if isinstance(pressure, str) and "/" in pressure:
+                try:
+                    systolic, diastolic = (float(part) for part in pressure.split("/", 1))
+                except ValueError:
+                    continue
+                add(BLOOD_PRESSURE_CODES[0], None, None, VITAL_SIGNS, None, when, systolic)
+                add(BLOOD_PRESSURE_CODES[1], None, None, VITAL_SIGNS, None, when, diastolic)
+
+        return cls(
+            codes, displays, units, categories, ref_low, ref_high,
+            np.asarray(index_col, dtype=np.int32),
+            np.asarray(time_col, dtype=np.float64),
+            np.asarray(value_col, dtype=np.float64),
+        )
+
+    def _layout(self) -> Tuple[np.ndarray, ...]:
+        """Group layout: rows are sorted by (code, time), so each code is one contiguous run."""
+        counts = np.bincount(self.code_index, minlength=len(self.codes))
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        last = np.where(counts > 0, ends - 1, 0)
+        from_end = (ends - 1)[self.code_index] - np.arange(len(self.values))
+        return counts, starts, ends, last, from_end
+
+    def _trailing_slope(self, starts: np.ndarray, ends: np.ndarray, last: np.ndarray, from_end: np.ndarray,
+                        size: int = SLOPE_WINDOW) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Least-squares slope (value units per day) over each code's last `size`
+        observations, and the span of that window in days.
+        """
+        n_codes = len(self.codes)
+        code = self.code_index
+        window = from_end < size
+        t = np.where(window, (self.times - self.times[last][code]) / _SECONDS_PER_DAY, 0.0)
+        v = np.where(window, self.values, 0.0)
+        w_n = np.bincount(code, weights=window, minlength=n_codes)
+        s_t = np.bincount(code, weights=t, minlength=n_codes)
+        s_v = np.bincount(code, weights=v, minlength=n_codes)
+        s_tt = np.bincount(code, weights=t * t, minlength=n_codes)
+        s_tv = np.bincount(code, weights=t * v, minlength=n_codes)
+        first = np.minimum(np.maximum(starts, ends - size), last)
+        span = (self.times[last] - self.times[first]) / _SECONDS_PER_DAY
+        with np.errstate(invalid="ignore", divide="ignore"):
+            denominator = w_n * s_tt - s_t * s_t
+            slope = np.where((w_n >= 2) & (denominator > 0), (w_n * s_tv - s_t * s_v) / denominator, np.nan)
+        return slope, span
+
+    def _grouped_std(self, mask: Optional[np.ndarray], n: np.ndarray, mean: np.ndarray, ddof: int = 0) -> np.ndarray:
+        """
+        Per-code standard deviation of the rows in `mask` (all rows when None), given their
+        count and mean. Squared deviations are summed about the mean rather than computed as
+        E[x^2] - E[x]^2, which cancels catastrophically on flat series.
+        """
+        deviation = self.values - mean[self.code_index]
+        if mask is not None:
+            deviation = np.where(mask, deviation, 0.0)
+        squares = np.bincount(self.code_index, weights=deviation * deviation, minlength=len(self.codes))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.where(n > ddof, squares / (n - ddof), np.nan))
+        # A constant series still leaves ~1e-15 * mean of rounding in its mean
+        std[std <= STD_FLOOR * np.abs(mean)] = 0.0
+        return std
+
+    def _out_of_range(self, values: np.ndarray, code: Optional[np.ndarray] = None) -> np.ndarray:
+        """Mask of values outside their code's reference range (per code, or per row when `code` is given)."""
+        low, high = self.ref_low, self.ref_high
+        if code is not None:
+            low, high = low[code], high[code]
+        return (values < np.nan_to_num(low, nan=-np.inf)) | (values > np.nan_to_num(high, nan=np.inf))
+
+    def analyze(self, since: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Per-code signals for observations recorded at or after `since` (POSIX
+        seconds) against the baseline recorded before it. Without `since`, the
+        latest observation of each code is compared with everything before it.
+
+        Returns {code: {display, unit, latest, previous, delta, baseline_mean,
+        baseline_std, baseline_count, z_score, slope_per_day, reference_low,
+        reference_high, abnormal, range_crossing, new_count}} for codes with at
+        least one new observation.
+        """
+        n_codes = len(self.codes)
+        if not len(self.values) or not n_codes:
+            return {}
+        code, times, values = self.code_index, self.times, self.values
+
+        counts, starts, ends, last, from_end = self._layout()
+        present = counts > 0
+
+        if since is None:
+            recent = from_end == 0
+        else:
+            recent = times >= since
+        baseline = ~recent
+
+        new_count = np.bincount(code, weights=recent, minlength=n_codes)
+        base_n = np.bincount(code, weights=baseline, minlength=n_codes)
+        base_sum = np.bincount(code, weights=np.where(baseline, values, 0.0), minlength=n_codes)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            base_mean = base_sum / base_n
+        base_std = self._grouped_std(baseline, base_n, base_mean, ddof=1)
+
+        latest = values[last]
+        # Value just before the new observations: the last baseline row of each code
+        first_new = ends - new_count.astype(np.int64)
+        has_previous = first_new > starts
+        previous = np.where(has_previous, values[np.maximum(first_new - 1, 0)], np.nan)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z_score = np.where((base_n >= MIN_BASELINE) & (base_std > 0), (latest - base_mean) / base_std, np.nan)
+
+        slope, _ = self._trailing_slope(starts, ends, last, from_end)
+
+        low, high = self.ref_low, self.ref_high
+        has_range = ~np.isnan(low) | ~np.isnan(high)
+        latest_out = self._out_of_range(latest)
+        previous_out = self._out_of_range(previous)
+        exited = has_range & has_previous & latest_out & ~previous_out
+        returned = has_range & has_previous & ~latest_out & previous_out
+
+        signals: Dict[str, Dict] = {}
+        for cid in np.flatnonzero(present & (new_count > 0)):
+            signals[self.codes[cid]] = {
+                "display": self.displays[cid],
+                "unit": self.units[cid],
+                "latest": float(latest[cid]),
+                "previous": _optional(previous[cid]),
+                "delta": _optional(latest[cid] - previous[cid]),
+                "baseline_mean": _optional(base_mean[cid]),
+                "baseline_std": _optional(base_std[cid]),
+                "baseline_count": int(base_n[cid]),
+                "z_score": _optional(z_score[cid]),
+                "slope_per_day": _optional(slope[cid]),
+                "reference_low": _optional(low[cid]),
+                "reference_high": _optional(high[cid]),
+                "abnormal": bool(has_range[cid] and latest_out[cid]),
+                "range_crossing": "exit" if exited[cid] else "return" if returned[cid] else None,
+                "new_count": int(new_count[cid]),
+            }
+        return signals
+
+
+    def summarize(self) -> List[Dict]:
+        """
+        Compact per-code summary of the whole history, ordered by category and
+        display name: {code, display, unit, category, count, latest, latest_time,
+        min, max, trend, abnormal_count, reference_low, reference_high}.
+        Trend is 'rising' / 'falling' when the fitted change over the last
+        TREND_WINDOW observations exceeds half the code's overall standard deviation, else 'stable'.
+        """
+        n_codes = len(self.codes)
+        if not len(self.values) or not n_codes:
+            return []
+        code, values = self.code_index, self.values
+        counts, starts, ends, last, from_end = self._layout()
+        present = np.flatnonzero(counts > 0)
+
+        # reduceat over the start of each non-empty run gives per-code extremes
+        minimum = np.full(n_codes, np.nan)
+        maximum = np.full(n_codes, np.nan)
+        minimum[present] = np.minimum.reduceat(values, starts[present])
+        maximum[present] = np.maximum.reduceat(values, starts[present])
+        abnormal = np.bincount(code, weights=self._out_of_range(values, code), minlength=n_codes)
+
+        total = np.bincount(code, weights=values, minlength=n_codes)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / counts
+        std = self._grouped_std(None, counts, mean)
+        slope, span = self._trailing_slope(starts, ends, last, from_end, TREND_WINDOW)
+        change = np.nan_to_num(slope * span)
+        trend = np.where(change > 0.5 * std, 1, np.where(change < -0.5 * std, -1, 0))
+        trend[std == 0] = 0
+
+        series = []
+        for cid in present:
+            series.append({
+                "code": self.codes[cid],
+                "display": self.displays[cid],
+                "unit": self.units[cid],
+                "category": self.categories[cid],
+                "count": int(counts[cid]),
+                "latest": float(values[last[cid]]),
+                "latest_time": datetime.fromtimestamp(self.times[last[cid]], timezone.utc).isoformat(),
+                "min": float(minimum[cid]),
+                "max": float(maximum[cid]),
+                "trend": TRENDS[int(trend[cid])],
+                "abnormal_count": int(abnormal[cid]),
+                "reference_low": _optional(self.ref_low[cid]),
+                "reference_high": _optional(self.ref_high[cid]),
+            })
+        series.sort(key=lambda item: (CATEGORY_ORDER.get(item["category"], len(CATEGORY_ORDER)), item["display"]))
+        return series
+
+
+def observation_category(resource: dict) -> str:
+    """First category code of an Observation ('vital-signs', 'laboratory', ...), or 'other'."""
+    for category in resource.get("category") or []:
+        for coding in category.get("coding") or []:
+            if coding.get("code"):
+                return coding["code"]
+    return OTHER_CATEGORY
+
+
+def _optional(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, 4) + 0.0  # + 0.0 folds -0.0
+
+
+_table_cache: "OrderedDict[Tuple[int, int], ObservationTable]" = OrderedDict()
+
+
+def get_observation_table(patient_id: int, version: int, bundle: dict) -> ObservationTable:
+    """Flattened observations for a patient bundle version, cached (LRU) by (patient_id, version)."""
+    key = (patient_id, version)
+    table = _table_cache.get(key)
+    if table is not None:
+        _table_cache.move_to_end(key)
+        return table
+    table = ObservationTable.from_bundle(bundle)
+    cache_observation_table(patient_id, version, table)
+    logger.info(f"Flattened {len(table)} numeric observations for patient {patient_id} v{version}")
+    return table
+
+
+def cache_observation_table(patient_id: int, version: int, table: ObservationTable):
+    """Stores a table flattened elsewhere (e.g. in a worker thread) in the LRU cache."""
+    _table_cache[(patient_id, version)] = table
+    _table_cache.move_to_end((patient_id, version))
+    while len(_table_cache) > CACHE_SIZE:
+        _table_cache.popitem(last=False)
+
+
+def observation_signals(patient_id: int, version: int, bundle: dict, since=None) -> Dict[str, Dict]:
+    """Numeric signals for observations recorded since `since` (datetime, ISO string or None)."""
+    since_seconds = _epoch_seconds(since) if since is not None else None
+    return get_observation_table(patient_id, version, bundle).analyze(since_seconds)
+
+
+def score_signals(signals: Dict[str, Dict]) -> Dict:
+    """
+    Clinical significance points and notes for numeric signals.
+    Returns {"score", "notes"} in the same shape as clinical_vocab.score_indicators.
+    """
+    score = 0
+    notes: List[str] = []
+    for signal in signals.values():
+        name, unit = signal["display"], signal["unit"]
+        latest = f"{signal['latest']:g} {unit}".strip()
+        reference = f"{signal['reference_low']:g}-{signal['reference_high']:g}" \
+            if signal["reference_low"] is not None and signal["reference_high"] is not None else None
+        was = f", was {signal['previous']:g}" if signal["previous"] is not None else ""
+        if signal["range_crossing"] == "exit":
+            score += NUMERIC_SIGNAL_WEIGHTS["range_exit"]
+            notes.append(f"Value left reference range: {name} {latest} (range {reference}{was})")
+        elif signal["range_crossing"] == "return":
+            score += NUMERIC_SIGNAL_WEIGHTS["range_return"]
+            notes.append(f"Value returned to reference range: {name} {latest} (range {reference}{was})")
+        z_score = signal["z_score"]
+        if z_score is not None and abs(z_score) >= Z_SIGNIFICANT:
+            critical = abs(z_score) >= Z_CRITICAL
+            score += NUMERIC_SIGNAL_WEIGHTS["z_critical" if critical else "z_significant"]
+            notes.append(
+                f"{'Marked' if critical else 'Notable'} deviation from baseline: {name} {latest} "
+                f"(z={z_score:+.1f}, baseline {signal['baseline_mean']:.1f} ± {signal['baseline_std']:.1f})"
+            )
+    return {"score": score, "notes": notes}
+
+
+CATEGORY_HEADINGS = {VITAL_SIGNS: "Vital Signs", LABORATORY: "Lab Results"}
+
+
+def _compact(value: float) -> str:
+    return f"{round(value, 2):g}" if abs(value) < 1e5 else f"{value:.0f}"
+
+
+def format_series(item: Dict, as_of: Optional[str] = None) -> str:
+    """
+    Compact prompt fragment for a summarize() entry, e.g.
+    'Heart rate 63 /min [61-97, n=11, falling, 2 abnormal]'. The latest date is
+    shown only when it differs from `as_of` (the newest date in the table).
+    """
+    unit = f" {item['unit']}" if item["unit"] else ""
+    text = f"{item['display']} {_compact(item['latest'])}{unit}"
+    if item["latest_time"][:10] != as_of:
+        text += f" on {item['latest_time'][:10]}"
+    details = []
+    if item["count"] > 1:
+        details += [f"{_compact(item['min'])}-{_compact(item['max'])}", f"n={item['count']}", item["trend"]]
+    if item["abnormal_count"]:
+        details.append(f"{item['abnormal_count']} abnormal")
+    return f"{text} [{', '.join(details)}]" if details else text
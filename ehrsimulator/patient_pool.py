@@ -0,0 +1,122 @@
+"""
+Background refill of the pre-generated patient pool.
+
+Synthea takes seconds to generate a patient, so admissions take bundles from a
+pool (the patient_pool table) that is kept at a target depth in the background.
+The filler runs up to `concurrency` generations at once while the pool is below
+target. It is woken as soon as a bundle is taken, and it backs off
+exponentially while the generator fails. The pool lives in the database, so it
+survives restarts and is shared by every server process. Each process runs its
+own filler; they may overshoot the target by up to `concurrency` each.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger("ehrsimulator")
+
+RATE_WINDOW_SECONDS = 600  # refill rate is averaged over this window
+MAX_BACKOFF_SECONDS = 60.0
+
+
+class PoolFiller:
+    """Keeps a persisted pool topped up to `target` using at most `concurrency` parallel generations."""
+
+    def __init__(self, target: int, concurrency: int, depth: Callable[[], Awaitable[int]],
+                 generate: Callable[[], Awaitable[dict]], store: Callable[[dict], Awaitable[bool]],
+                 poll_seconds: float = 30.0):
+        self.target = target
+        self.concurrency = max(concurrency, 1)
+        self.depth = depth  # async () -> bundles in the pool
+        self.generate = generate  # async () -> bundle; raises when the generator is unavailable
+        self.store = store  # async (bundle) -> False when it was not added (e.g. duplicate)
+        self.poll_seconds = poll_seconds
+        self.stats = Counter()
+        self.completed = deque()  # monotonic times of recent successful refills
+        self.last_error: Optional[str] = None
+        self.last_depth: Optional[int] = None  # as of the filler's latest check
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and self.target > 0:
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        """Called after a bundle is taken so refilling starts immediately."""
+        self._wake.set()
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                # Cleared before checking depth so a take during the check still wakes the next sleep
+                self._wake.clear()
+                self.last_depth = await self.depth()
+                missing = self.target - self.last_depth
+                if missing <= 0:
+                    await self._sleep(self.poll_seconds)
+                    continue
+                results = await asyncio.gather(
+                    *(self._refill_one() for _ in range(min(missing, self.concurrency))), return_exceptions=True
+                )
+                failures = [r for r in results if isinstance(r, Exception)]
+                if failures and len(failures) == len(results):
+                    logger.warning(f"Patient pool refill failed ({failures[0]}), retrying in {backoff:.0f}s")
+                    await self._sleep(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+                else:
+                    backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Database errors: keep the loop alive and retry later
+                self.last_error = str(e)
+                logger.warning(f"Patient pool filler error: {e}")
+                await self._sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+    async def _refill_one(self):
+        try:
+            bundle = await self.generate()
+        except Exception as e:
+            self.stats["failed"] += 1
+            self.last_error = str(e) or type(e).__name__
+            raise
+        if await self.store(bundle):
+            self.stats["generated"] += 1
+            self.completed.append(time.monotonic())
+        else:
+            self.stats["duplicates"] += 1
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def refill_rate(self) -> float:
+        """Bundles added per minute over the last RATE_WINDOW_SECONDS."""
+        cutoff = time.monotonic() - RATE_WINDOW_SECONDS
+        while self.completed and self.completed[0] < cutoff:
+            self.completed.popleft()
+        return round(len(self.completed) * 60.0 / RATE_WINDOW_SECONDS, 3)
+
+    def report(self) -> dict:
+        return {
+            "target": self.target,
+            "refill_concurrency": self.concurrency,
+            "running": self._task is not None and not self._task.done(),
+            "refill_per_minute": self.refill_rate(),
+            **{key: self.stats[key] for key in ("generated", "failed", "duplicates", "taken", "missed")},
+            "last_error": self.last_error,
+        }
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
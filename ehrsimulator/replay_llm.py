@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Replays recorded summary traffic through the current pipeline with recorded LLM responses, to
+measure pipeline CPU cost and detect output drift without running inference.
+
+Usage:
+    python replay_llm.py RECORDING [--speed N] [--limit N] [--report FILE]
+
+RECORDING comes from running the simulator with LLM_RECORD_MODE=record (see llm_recording.py).
+Each recorded summary is re-run through run_summary_pipeline on its recorded bundle version:
+- get_fhir_stats, observation signals, prompt building and clinical significance scoring run for real.
+- call_llm is answered from the recording.
+- Change-markup processing and diffs run for real.
+The result is then compared field by field with the recorded response.
+
+--speed 0 (default) runs summaries one after another as fast as possible and reports CPU time
+per summary. --speed N replays the recording's arrival times and LLM latencies N times faster,
+with summaries overlapping as they did when recorded.
+
+Needs no database; sectioned and map_reduce summaries depend on database caches and are skipped.
+Exits with status 1 when any output drifted or any LLM request was not in the recording.
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import statistics
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+from bench import print_table
+from llm_recording import read_recording
+from responses import encode_json
+
+DRIFT_EXAMPLES = 5
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def load(path: str, limit: Optional[int]) -> Tuple[List[dict], Dict[Tuple[int, int], dict]]:
+    summaries, bundles = [], {}
+    for record in read_recording(path, ("summary", "bundle")):
+        if record["kind"] == "bundle":
+            bundles[(record["patient_id"], record["version"])] = record["data"]
+        else:
+            summaries.append(record)
+    summaries.sort(key=lambda record: record["at"])
+    return summaries[:limit] if limit else summaries, bundles
+
+
+def drifted_fields(recorded: dict, replayed: dict) -> List[str]:
+    # Round-trip through the JSON encoder so both sides have the types they were recorded with
+    replayed = orjson.loads(encode_json(replayed))
+    return sorted(key for key in recorded.keys() | replayed.keys() if recorded.get(key) != replayed.get(key))
+
+
+def first_difference(recorded: str, replayed: str, context: int = 40) -> str:
+    index = next((i for i, (a, b) in enumerate(zip(recorded, replayed)) if a != b), min(len(recorded), len(replayed)))
+    start = max(index - context, 0)
+    return f"at char {index}: recorded {recorded[start:index + context]!r} / replayed {replayed[start:index + context]!r}"
+
+
+async def replay(ehr, summaries: List[dict], bundles: Dict, speed: float) -> List[dict]:
+    """Re-runs each summary; returns one result per summary with its output, wall time and CPU time."""
+
+    async def run(record: dict) -> dict:
+        data = bundles.get((record["patient_id"], record["patient_version"]))
+        if record["strategy"] != "full" or data is None:
+            return {"record": record, "skipped": "strategy needs database" if data is not None else "bundle missing"}
+        patient = ehr.Patient(id=record["patient_id"], version=record["patient_version"], data=data)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        output = await ehr.run_summary_pipeline(
+            None, patient, record["summary_type"], record["model"], record["strategy"], record["escalate"],
+            record["previous_summary"], parse_time(record["previous_created_at"]),
+        )
+        return {"record": record, "output": output, "seconds": time.perf_counter() - start,
+                "cpu_seconds": time.process_time() - cpu_start}
+
+    if speed <= 0:
+        return [await run(record) for record in summaries]
+
+    first = parse_time(summaries[0]["at"])
+    origin = time.perf_counter()
+
+    async def run_at(record: dict) -> dict:
+        delay = (parse_time(record["at"]) - first).total_seconds() / speed - (time.perf_counter() - origin)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return await run(record)
+
+    return await asyncio.gather(*(run_at(record) for record in summaries))
+
+
+def report(results: List[dict], wall: float, cpu: float, speed: float, llm: dict, report_path: Optional[str]) -> bool:
+    """Prints the replay summary; returns True when outputs and LLM requests all matched."""
+    ran = [result for result in results if "output" in result]
+    skipped = len(results) - len(ran)
+    drift_counts, examples, drifted = {}, [], 0
+    report_file = open(report_path, "wb") if report_path else None
+    for result in ran:
+        record, output = result["record"], result["output"]
+        fields = drifted_fields(record["output"], output)
+        if not fields:
+            continue
+        drifted += 1
+        for field in fields:
+            drift_counts[field] = drift_counts.get(field, 0) + 1
+        if len(examples) < DRIFT_EXAMPLES:
+            detail = first_difference(record["output"].get("summary") or "", output.get("summary") or "") if "summary" in fields else ""
+            examples.append([record["patient_id"], record["patient_version"], record["summary_type"], ", ".join(fields), detail])
+        if report_file:
+            report_file.write(encode_json({
+                "patient_id": record["patient_id"], "patient_version": record["patient_version"], "at": record["at"],
+                "fields": fields, "recorded": record["output"], "replayed": output,
+            }) + b"\n")
+    if report_file:
+        report_file.close()
+
+    print(f"{len(ran)} summaries replayed, {skipped} skipped, {drifted} drifted, {wall:.2f}s wall"
+          + (f" at {speed:g}x" if speed > 0 else ""))
+    print(f"LLM replay: {llm.get('hits', 0)} hits, {llm.get('misses', 0)} misses (request inputs changed), "
+          f"{llm.get('prompt_drift', 0)} with changed prompts")
+    if ran:
+        print(f"Pipeline CPU: {cpu * 1000:.1f} ms total, {cpu * 1000 / len(ran):.2f} ms per summary")
+    if ran and speed <= 0:
+        cpu_ms = sorted(result["cpu_seconds"] * 1000 for result in ran)
+        rows = []
+        for summary_type in sorted({result["record"]["summary_type"] for result in ran}):
+            times = sorted(result["cpu_seconds"] * 1000 for result in ran if result["record"]["summary_type"] == summary_type)
+            rows.append([summary_type, len(times), f"{statistics.median(times):.2f}", f"{times[min(int(0.95 * len(times)), len(times) - 1)]:.2f}", f"{times[-1]:.2f}"])
+        rows.append(["all", len(cpu_ms), f"{statistics.median(cpu_ms):.2f}", f"{cpu_ms[min(int(0.95 * len(cpu_ms)), len(cpu_ms) - 1)]:.2f}", f"{cpu_ms[-1]:.2f}"])
+        print_table(["summary type", "count", "cpu p50 ms", "cpu p95 ms", "cpu max ms"], rows)
+    if drift_counts:
+        print("Drifted fields: " + ", ".join(f"{field} {count}" for field, count in sorted(drift_counts.items())))
+        print_table(["patient", "version", "type", "fields", "first summary difference"], examples)
+        if report_path:
+            print(f"Drifted outputs written to {report_path}")
+    return not drifted and not llm.get("misses")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded summary traffic with recorded LLM responses")
+    parser.add_argument("recording", help="JSONL file written with LLM_RECORD_MODE=record")
+    parser.add_argument("--speed", type=float, default=0.0, help="Replay N times faster than recorded; 0 runs back to back")
+    parser.add_argument("--limit", type=int, help="Replay only the first N summaries")
+    parser.add_argument("--report", help="Write drifted outputs (recorded and replayed) to this JSONL file")
+    args = parser.parse_args()
+
+    # main reads its configuration at import time
+    os.environ["LLM_RECORD_MODE"] = "replay"
+    os.environ["LLM_RECORDING_PATH"] = args.recording
+    os.environ["LLM_REPLAY_SPEED"] = str(args.speed)
+    import main as ehr
+    # Measure the pipeline, not the per-call INFO logging
+    logging.disable(logging.INFO)
+
+    summaries, bundles = load(args.recording, args.limit)
+    if not summaries:
+        raise SystemExit(f"No summaries recorded in {args.recording}")
+    # Keep the collector from re-scanning the loaded recording, which is not pipeline work
+    gc.freeze()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    results = asyncio.run(replay(ehr, summaries, bundles, args.speed))
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    if not report(results, wall, cpu, args.speed, ehr.llm_recorder.report(), args.report):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
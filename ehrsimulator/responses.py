@@ -0,0 +1,175 @@
+"""
+High-performance JSON responses for large payloads (patient bundles, summary history).
+
+Encodes with orjson instead of FastAPI's jsonable_encoder + json.dumps path, can
+splice pre-serialized JSON text straight from the database, and compresses the
+body with the best encoding the client accepts (zstd, br, gzip) once it is
+large enough for compression to pay off. Streamed bodies can be gzipped on the fly.
+
+ETags passed to json_response are sent as weak validators: the compressed and identity
+representations share one tag, which a strong validator must not do.
+"""
+
+import asyncio
+import gzip
+import os
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+# Bodies at least this large are compressed in a worker thread instead of on the event loop
+COMPRESSION_THREAD_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_THREAD_MIN_BYTES", str(256 * 1024)))
+
+# Fast levels: these bodies are compressed on every request, not archived
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+
+def _compress_gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _compress_brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=BROTLI_QUALITY)
+
+
+def _compress_zstd(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+
+
+# Server preference order; encodings whose library is missing are skipped
+COMPRESSORS = {}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _compress_zstd
+if brotli is not None:
+    COMPRESSORS["br"] = _compress_brotli
+COMPRESSORS["gzip"] = _compress_gzip
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {encoding: q-value}."""
+    accepted = {}
+    if not header:
+        return accepted
+    for item in header.split(","):
+        parts = item.strip().split(";")
+        encoding = parts[0].strip().lower()
+        if not encoding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[encoding] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Choose the content encoding for a response, or None for identity.
+    Picks the highest client q-value, breaking ties by server preference.
+    """
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in available or list(COMPRESSORS):
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_body(body: bytes, accept_encoding: Optional[str]) -> tuple:
+    """Return (body, encoding) with body compressed when size and client allow it."""
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return body, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return COMPRESSORS[encoding](body), encoding
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip a streamed body chunk by chunk, for responses too large to compress in one piece."""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode_json(content: Any) -> bytes:
+    """Serialize to compact JSON bytes; datetimes are emitted as ISO 8601."""
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def weak_etag(etag: str) -> str:
+    """The weak form of an entity tag."""
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+async def json_response(
+    request: Request,
+    content: Any = None,
+    raw: Optional[bytes] = None,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Build a JSON response, compressed according to the request's Accept-Encoding.
+
+    Pass `raw` with already-serialized JSON bytes (e.g. text selected from
+    Postgres) to skip encoding entirely; otherwise `content` is encoded with orjson.
+    Large bodies are compressed off the event loop.
+    """
+    body = raw if raw is not None else encode_json(content)
+    accept_encoding = request.headers.get("accept-encoding")
+    if len(body) >= COMPRESSION_THREAD_MIN_BYTES:
+        body, encoding = await asyncio.to_thread(compress_body, body, accept_encoding)
+    else:
+        body, encoding = compress_body(body, accept_encoding)
+
+    response_headers = dict(headers or {})
+    if "ETag" in response_headers:
+        response_headers["ETag"] = weak_etag(response_headers["ETag"])
+    response_headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, headers=response_headers, media_type="application/json")
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match header matches etag (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in candidates)
+
+
+def not_modified_response(etag: str) -> Response:
+    """304 response carrying the current validator, weak as json_response sends it."""
+    return Response(status_code=304, headers={"ETag": weak_etag(etag), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"})
@@ -0,0 +1,170 @@
+"""
+Sentence-level diff engine for clinical summaries.
+
+Sentences are tokenized once and normalized (case-folded, whitespace collapsed)
+into integer ids, then compared with Myers' O((N+M)D) shortest-edit-script
+algorithm. Sentences that appear on only one side are set aside before the
+search, so a heavy rewrite does not blow up D. Deleted sentences that reappear
+elsewhere are reported as moves.
+"""
+
+import html
+import re
+from typing import Dict, List
+
+_SENTENCE_RE = re.compile(r"[^.!?]+[.!?]*")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, keeping their terminating punctuation."""
+    sentences = (match.group().strip() for match in _SENTENCE_RE.finditer(text))
+    return [s for s in sentences if s.strip(".!? ")]
+
+
+def normalize_sentence(sentence: str) -> str:
+    return _WHITESPACE_RE.sub(" ", sentence.casefold()).rstrip(".!? ")
+
+
+def _myers(a: List[int], b: List[int]) -> List[tuple]:
+    """
+    Shortest edit script between two id sequences.
+    Returns ('equal' | 'delete' | 'insert', index) steps in order, where index is
+    into `a` for equal/delete and into `b` for insert.
+    """
+    n, m = len(a), len(b)
+    if n == 0 or m == 0:
+        return [("delete", i) for i in range(n)] + [("insert", j) for j in range(m)]
+
+    offset = n + m
+    v = [0] * (2 * offset + 2)
+    trace = []
+    for d in range(offset + 1):
+        trace.append(v[offset - d:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, a, b, d)
+    raise AssertionError("unreachable: an edit script always exists")
+
+
+def _backtrack(trace: List[List[int]], a: List[int], b: List[int], d_final: int) -> List[tuple]:
+    steps = []
+    x, y = len(a), len(b)
+    for d in range(d_final, 0, -1):
+        # trace[d] holds v[-d .. d+1] as it was before round d
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + d] < v[k + 1 + d]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + d]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            steps.append(("equal", x))
+        if x == prev_x:
+            y -= 1
+            steps.append(("insert", y))
+        else:
+            x -= 1
+            steps.append(("delete", x))
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        steps.append(("equal", x))
+    steps.reverse()
+    return steps
+
+
+def diff_sentences(old_text: str, new_text: str) -> List[Dict]:
+    """
+    Structured sentence diff from old_text to new_text.
+
+    Returns ops in display order, each {"op", "text", "old_index", "new_index"}
+    where op is 'equal', 'insert', 'delete' or 'move'. A move is a sentence
+    deleted in one place and inserted in another; it appears once, at its new
+    position, with the old position in old_index.
+    """
+    old_sentences = split_sentences(old_text or "")
+    new_sentences = split_sentences(new_text or "")
+
+    ids: Dict[str, int] = {}
+    old_ids = [ids.setdefault(normalize_sentence(s), len(ids)) for s in old_sentences]
+    new_ids = [ids.setdefault(normalize_sentence(s), len(ids)) for s in new_sentences]
+
+    # Sentences present on only one side can never be matched; diff the rest
+    shared = set(old_ids) & set(new_ids)
+    old_kept = [i for i, sid in enumerate(old_ids) if sid in shared]
+    new_kept = [j for j, sid in enumerate(new_ids) if sid in shared]
+    steps = _myers([old_ids[i] for i in old_kept], [new_ids[j] for j in new_kept])
+
+    # Map the reduced script back onto full sequences
+    matched_old, matched_new = {}, {}
+    ri = rj = 0
+    for op, _ in steps:
+        if op == "equal":
+            matched_old[old_kept[ri]] = new_kept[rj]
+            matched_new[new_kept[rj]] = old_kept[ri]
+            ri += 1
+            rj += 1
+        elif op == "delete":
+            ri += 1
+        else:
+            rj += 1
+
+    # Pair unmatched deletions with unmatched insertions of the same sentence as moves
+    deleted_by_id: Dict[int, List[int]] = {}
+    for i, sid in enumerate(old_ids):
+        if i not in matched_old:
+            deleted_by_id.setdefault(sid, []).append(i)
+    moved_from = {}
+    for j, sid in enumerate(new_ids):
+        if j not in matched_new and deleted_by_id.get(sid):
+            moved_from[j] = deleted_by_id[sid].pop(0)
+    moved_old = set(moved_from.values())
+
+    ops = []
+    i = 0
+    for j, sentence in enumerate(new_sentences):
+        if j in matched_new:
+            # Flush deletions that sit before this anchored old sentence
+            anchor = matched_new[j]
+            while i < anchor:
+                if i not in matched_old and i not in moved_old:
+                    ops.append({"op": "delete", "text": old_sentences[i], "old_index": i, "new_index": None})
+                i += 1
+            i = anchor + 1
+            ops.append({"op": "equal", "text": sentence, "old_index": anchor, "new_index": j})
+        elif j in moved_from:
+            ops.append({"op": "move", "text": sentence, "old_index": moved_from[j], "new_index": j})
+        else:
+            ops.append({"op": "insert", "text": sentence, "old_index": None, "new_index": j})
+    while i < len(old_sentences):
+        if i not in matched_old and i not in moved_old:
+            ops.append({"op": "delete", "text": old_sentences[i], "old_index": i, "new_index": None})
+        i += 1
+    return ops
+
+
+_OP_CLASSES = {"insert": "highlight-new", "delete": "highlight-deleted", "move": "highlight-moved"}
+
+
+def render_diff_html(ops: List[Dict]) -> str:
+    """Render diff ops as summary HTML; unchanged sentences are left unwrapped."""
+    parts = []
+    for op in ops:
+        text = html.escape(op["text"])
+        css_class = _OP_CLASSES.get(op["op"])
+        parts.append(f'<span class="{css_class}">{text}</span>' if css_class else text)
+    return f'<div class="summary-content">{" ".join(parts)}</div>'
@@ -0,0 +1,119 @@
+"""
+Debounced background re-summarization into summary drafts.
+
+Writers notify the scheduler when a patient's data changes. The scheduler waits
+for a quiet period (the debounce) and then builds a draft of the next summary
+in the background. Notifications that arrive while work is already queued or
+running for the patient collapse into one follow-up build.
+
+The wait never extends past the staleness bound, counted from the first change
+that the latest draft does not include. So a patient with a steady stream of
+updates still gets a fresh draft at least that often, plus build time.
+
+Drafts are kept in memory, one per patient, evicting the least recently built.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger("ehrsimulator")
+
+
+class DraftScheduler:
+    """Per-patient debounced draft builds with bounded staleness."""
+
+    def __init__(self, build: Callable[[int], Awaitable[Optional[dict]]], debounce: float, max_staleness: float, max_drafts: int = 1024):
+        self.build = build  # async (patient_id) -> draft dict, or None when there is nothing to store
+        self.debounce = debounce
+        self.max_staleness = max_staleness
+        self.max_drafts = max_drafts
+        self.drafts: "OrderedDict[int, dict]" = OrderedDict()
+        self.deadlines: Dict[int, float] = {}
+        self.pending_since: Dict[int, float] = {}  # first change not yet picked up by a build
+        self.stale_since: Dict[int, float] = {}  # first change not included in the stored draft
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.building: Set[int] = set()
+        self.stats = Counter()
+
+    def notify(self, patient_id: int):
+        """Records new data for a patient and schedules (or defers) its draft build."""
+        now = time.monotonic()
+        self.stats["notifications"] += 1
+        first = self.pending_since.setdefault(patient_id, now)
+        self.stale_since.setdefault(patient_id, now)
+        self.deadlines[patient_id] = min(now + self.debounce, first + self.max_staleness)
+        if patient_id in self.tasks:
+            self.stats["collapsed"] += 1
+            return
+        self.tasks[patient_id] = asyncio.create_task(self._run(patient_id))
+
+    async def _run(self, patient_id: int):
+        try:
+            while patient_id in self.deadlines:
+                delay = self.deadlines[patient_id] - time.monotonic()
+                if delay > 0:
+                    # The deadline may move while sleeping; re-check it on waking
+                    await asyncio.sleep(delay)
+                    continue
+                del self.deadlines[patient_id]
+                del self.pending_since[patient_id]
+                await self._build(patient_id)
+        finally:
+            self.tasks.pop(patient_id, None)
+
+    async def _build(self, patient_id: int):
+        start = time.perf_counter()
+        self.building.add(patient_id)
+        try:
+            draft = await self.build(patient_id)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"Summary draft build failed for patient {patient_id}: {e}")
+            return
+        finally:
+            self.building.discard(patient_id)
+        if draft is None:
+            self.stats["skipped"] += 1
+            return
+        draft["built_at"] = time.monotonic()
+        draft["build_seconds"] = round(time.perf_counter() - start, 3)
+        self.drafts[patient_id] = draft
+        self.drafts.move_to_end(patient_id)
+        while len(self.drafts) > self.max_drafts:
+            self.drafts.popitem(last=False)
+        # Changes that arrived during the build are still missing from this draft
+        if patient_id in self.pending_since:
+            self.stale_since[patient_id] = self.pending_since[patient_id]
+        else:
+            self.stale_since.pop(patient_id, None)
+        self.stats["built"] += 1
+        logger.info(f"Summary draft built for patient {patient_id} in {draft['build_seconds']:.2f}s")
+
+    def get(self, patient_id: int) -> Optional[dict]:
+        return self.drafts.get(patient_id)
+
+    def staleness(self, patient_id: int) -> Optional[float]:
+        """Seconds since the first change the stored draft lacks, or None when none was notified."""
+        since = self.stale_since.get(patient_id)
+        return None if since is None else time.monotonic() - since
+
+    def discard(self, patient_id: int):
+        self.drafts.pop(patient_id, None)
+
+    def report(self) -> dict:
+        return {
+            "debounce_seconds": self.debounce,
+            "max_staleness_seconds": self.max_staleness,
+            "drafts": len(self.drafts),
+            "queued": len(self.deadlines),
+            "building": len(self.building),
+            **{key: self.stats[key] for key in ("notifications", "collapsed", "built", "skipped", "failed")},
+        }
+
+    async def shutdown(self):
+        for task in list(self.tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
@@ -0,0 +1,80 @@
+"""
+Delta-compressed storage for superseded summary versions.
+
+The active summary is always stored in full. When a version is superseded it is
+rewritten as a line diff against the nearest full snapshot (every
+SUMMARY_SNAPSHOT_INTERVAL versions), so a long chain of small incremental
+updates costs roughly one full copy per interval instead of one per version.
+Reconstruction needs only the snapshot and one delta.
+"""
+
+import difflib
+import json
+import os
+from typing import List, Optional, Tuple, Union
+
+SNAPSHOT_INTERVAL = max(int(os.getenv("SUMMARY_SNAPSHOT_INTERVAL", "10")), 1)
+
+STORAGE_FULL = "full"
+STORAGE_DELTA = "delta"
+
+# A delta op is either [start, end] (copy base lines start:end) or a literal string to insert
+DeltaOp = Union[List[int], str]
+
+
+def is_snapshot_version(version: int) -> bool:
+    """Versions 1, 1 + N, 1 + 2N, ... are kept as full snapshots."""
+    return (version - 1) % SNAPSHOT_INTERVAL == 0
+
+
+def snapshot_version_for(version: int) -> int:
+    """The full snapshot a version is diffed against."""
+    return version - (version - 1) % SNAPSHOT_INTERVAL
+
+
+def diff_ops(base: str, target: str) -> List[DeltaOp]:
+    """Line-level delta turning base into target."""
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    ops: List[DeltaOp] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(target_lines[j1:j2]))
+    return ops
+
+
+def patch_ops(base: str, ops: List[DeltaOp]) -> str:
+    """Apply a delta produced by diff_ops."""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return "".join(parts)
+
+
+def encode_delta(base_content: str, content: str, base_highlighted: Optional[str], highlighted: Optional[str]) -> str:
+    """
+    Encode a version's content and highlighted HTML against its snapshot.
+    Highlighted HTML is diffed against the snapshot's HTML when it has one,
+    otherwise kept verbatim inside the delta.
+    """
+    if highlighted is not None and base_highlighted is not None:
+        highlighted_delta = diff_ops(base_highlighted, highlighted)
+    else:
+        highlighted_delta = highlighted
+    return json.dumps({"c": diff_ops(base_content, content), "h": highlighted_delta}, separators=(",", ":"))
+
+
+def decode_delta(base_content: str, base_highlighted: Optional[str], delta: str) -> Tuple[str, Optional[str]]:
+    """Rebuild (content, highlighted_html) from a snapshot and an encoded delta."""
+    payload = json.loads(delta)
+    highlighted = payload["h"]
+    if isinstance(highlighted, list):
+        highlighted = patch_ops(base_highlighted or "", highlighted)
+    return patch_ops(base_content, payload["c"]), highlighted
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Seeded generator of Synthea-like FHIR R4 patient bundles for scale testing.
+
+The same seed and settings always give the same bundle. Bundles use the Synthea transaction
+layout: urn:uuid fullUrls and subject/encounter references. They contain:
+- Patient
+- AllergyIntolerance
+- Encounter, the last one an in-progress inpatient admission
+- Condition: chronic ones with MedicationRequest and CarePlan, plus acute episodes
+- Observation: vital signs, including blood pressure panels, and BMP/CBC/A1c labs
+- Procedure
+
+`resources` sets the approximate size of the bundle. `years` sets how far back the history
+goes. Together they let tests scale a patient from a small record to 100x the Synthea sample.
+Observation values drift around per-patient baselines, and the patient's conditions shift those
+baselines, so trend and reference-range analysis gets realistic input.
+
+Usage:
+    python synthetic_bundles.py serve [--port 8081] [--seed N] [--resources N] [--years N]
+    python synthetic_bundles.py write OUT --count N [--seed N] [--resources N] [--years N]
+
+`serve` is a local stand-in for the Synthea /generate-patient service. Each call returns the
+next bundle of a seeded sequence, and ?seed=&resources=&years= override the settings for one
+call. Without --seed the sequence starts at a random seed, so a restarted service does not hand
+out the same patients again. Point the simulator at it with SYNTHEA_URL, or set
+SYNTHEA_URL=synthetic to generate in-process. `write` produces a directory of bundles (like output/fhir) or, for an OUT ending in
+.ndjson, one bundle per line; both can be loaded with import_fhir.py.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from observation_analytics import REFERENCE_RANGES
+
+DEFAULT_RESOURCES = 500
+DEFAULT_YEARS = 10.0
+HISTORY_END = datetime(2025, 6, 1, 8, 0, tzinfo=timezone.utc)  # fixed so output does not depend on the clock
+
+LOINC = "http://loinc.org"
+SNOMED = "http://snomed.info/sct"
+RXNORM = "http://www.nlm.nih.gov/research/umls/rxnorm"
+UCUM = "http://unitsofmeasure.org"
+OBSERVATION_CATEGORY = "http://terminology.hl7.org/CodeSystem/observation-category"
+CONDITION_CLINICAL = "http://terminology.hl7.org/CodeSystem/condition-clinical"
+ACT_CODE = "http://terminology.hl7.org/CodeSystem/v3-ActCode"
+
+GIVEN_NAMES = {
+    "male": ["James", "Robert", "Michael", "David", "Carlos", "Wei", "Ahmed", "Samuel", "Joseph", "Daniel"],
+    "female": ["Mary", "Patricia", "Linda", "Maria", "Aisha", "Mei", "Sarah", "Emily", "Grace", "Rosa"],
+}
+FAMILY_NAMES = ["Smith", "Johnson", "Garcia", "Nguyen", "Patel", "Okafor", "Kowalski", "Schmidt", "Rossi", "Cohen"]
+CITIES = [("Boston", "02118"), ("Worcester", "01608"), ("Springfield", "01103"), ("Lowell", "01852"), ("Cambridge", "02139")]
+
+# SNOMED code, display, medications (RxNorm code, display), care plan (SNOMED code, display),
+# baseline shifts applied to the patient's observations while the condition is present
+CHRONIC_CONDITIONS = [
+    ("38341003", "Hypertension (disorder)", [("314076", "lisinopril 10 MG Oral Tablet")],
+     ("443402002", "Lifestyle education regarding hypertension (procedure)"), {"8480-6": 22.0, "8462-4": 10.0}),
+    ("44054006", "Diabetes mellitus type 2 (disorder)",
+     [("860975", "24 HR Metformin hydrochloride 500 MG Extended Release Oral Tablet")],
+     ("735985000", "Diabetes self management plan (record artifact)"), {"2339-0": 70.0, "4548-4": 2.2}),
+    ("55822004", "Hyperlipidemia (disorder)", [("316672", "Simvastatin 10 MG Oral Tablet")], None, {}),
+    ("195967001", "Asthma (disorder)", [("895994", "120 ACTUAT fluticasone propionate 0.044 MG/ACTUAT Metered Dose Inhaler")],
+     ("699728000", "Asthma self management (procedure)"), {"9279-1": 3.0, "59408-5": -2.0}),
+    ("431855005", "Chronic kidney disease stage 1 (disorder)", [], None, {"38483-4": 0.5, "6299-2": 8.0}),
+    ("271737000", "Anemia (disorder)", [("310325", "Ferrous sulfate 325 MG Oral Tablet")], None, {"718-7": -2.5}),
+]
+ACUTE_CONDITIONS = [
+    ("444814009", "Viral sinusitis (disorder)", None),
+    ("10509002", "Acute bronchitis (disorder)", ("313782", "Acetaminophen 325 MG Oral Tablet")),
+    ("195662009", "Acute viral pharyngitis (disorder)", None),
+    ("233604007", "Pneumonia (disorder)", ("308182", "Amoxicillin 250 MG Oral Capsule")),
+    ("68496003", "Polyp of colon (disorder)", None),
+    ("43878008", "Streptococcal sore throat (disorder)", ("834061", "Penicillin V Potassium 250 MG Oral Tablet")),
+]
+# SNOMED code, display, category, criticality
+ALLERGIES = [
+    ("91936005", "Allergy to penicillin", "medication", "high"),
+    ("300913006", "Shellfish allergy", "food", "high"),
+    ("418689008", "Allergy to grass pollen", "environment", "low"),
+    ("232350006", "House dust mite allergy", "environment", "low"),
+    ("91935009", "Allergy to peanuts", "food", "high"),
+]
+# SNOMED code, display, encounter class
+ENCOUNTER_TYPES = [
+    ("185349003", "Encounter for check up (procedure)", "AMB"),
+    ("185345009", "Encounter for symptom (procedure)", "AMB"),
+    ("50849002", "Emergency room admission (procedure)", "EMER"),
+]
+ADMISSION = ("183452005", "Emergency hospital admission (procedure)", "IMP")
+PROCEDURES = [
+    ("430193006", "Medication reconciliation (procedure)"),
+    ("710824005", "Assessment of health and social care needs (procedure)"),
+    ("171207006", "Depression screening (procedure)"),
+    ("23426006", "Measurement of respiratory function (procedure)"),
+    ("399208008", "Plain chest X-ray (procedure)"),
+]
+
+VITAL_CODES = ["8867-4", "9279-1", "8310-5", "59408-5", "72514-3"]
+BLOOD_PRESSURE_PANEL = ("85354-9", "Blood pressure panel with all children optional")
+BLOOD_PRESSURE = ["8480-6", "8462-4"]
+LAB_PANELS = [
+    ["2339-0", "6299-2", "38483-4", "49765-1", "2947-0", "6298-4", "2069-3", "20565-8"],  # basic metabolic panel
+    ["6690-2", "718-7", "777-3"],  # complete blood count
+]
+A1C = "4548-4"
+
+# Rough resources per encounter, used to size the history for a requested resource count
+RESOURCES_PER_ENCOUNTER = 11
+
+
+class BundleBuilder:
+    """Accumulates one patient's entries; every resource gets a seeded urn:uuid."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.entries: List[dict] = []
+        self.patient_ref: Optional[str] = None
+
+    def new_id(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def add(self, resource: dict) -> str:
+        resource_id = self.new_id()
+        resource = {"resourceType": resource.pop("resourceType"), "id": resource_id, **resource}
+        if self.patient_ref and resource["resourceType"] != "Patient":
+            key = "patient" if resource["resourceType"] == "AllergyIntolerance" else "subject"
+            resource[key] = {"reference": self.patient_ref}
+        self.entries.append({
+            "fullUrl": f"urn:uuid:{resource_id}",
+            "resource": resource,
+            "request": {"method": "POST", "url": resource["resourceType"]},
+        })
+        return f"urn:uuid:{resource_id}"
+
+
+def _concept(system: str, code: str, display: str) -> dict:
+    return {"coding": [{"system": system, "code": code, "display": display}], "text": display}
+
+
+def _timestamp(when: datetime) -> str:
+    return when.isoformat(timespec="seconds")
+
+
+def _observation(code: str, category: str, encounter: str, when: datetime, value: float) -> dict:
+    display, _, _, unit = REFERENCE_RANGES[code]
+    return {
+        "resourceType": "Observation",
+        "status": "final",
+        "category": [{"coding": [{"system": OBSERVATION_CATEGORY, "code": category, "display": category.replace("-", " ").title()}]}],
+        "code": _concept(LOINC, code, display),
+        "encounter": {"reference": encounter},
+        "effectiveDateTime": _timestamp(when),
+        "issued": when.isoformat(timespec="milliseconds"),
+        "valueQuantity": {"value": value, "unit": unit, "system": UCUM, "code": unit},
+    }
+
+
+class PatientModel:
+    """Per-patient baselines for numeric observations, shifted by the conditions present."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.baselines = {}
+        for code, (_, low, high, _) in REFERENCE_RANGES.items():
+            self.baselines[code] = rng.uniform(low + (high - low) * 0.25, high - (high - low) * 0.25)
+        self.shifts: Dict[str, float] = {}
+
+    def add_condition(self, shifts: Dict[str, float]):
+        for code, delta in shifts.items():
+            self.shifts[code] = self.shifts.get(code, 0.0) + delta
+
+    def value(self, code: str, unwell: float = 0.0) -> float:
+        _, low, high, _ = REFERENCE_RANGES[code]
+        spread = (high - low) / 8
+        value = self.baselines[code] + self.shifts.get(code, 0.0) + self.rng.gauss(unwell * spread, spread)
+        if code == "72514-3":
+            value = min(max(value, 0.0), 10.0)
+        return round(max(value, 0.0), 1 if high - low < 20 else 0)
+
+
+def generate_bundle(seed: int, resources: int = DEFAULT_RESOURCES, years: float = DEFAULT_YEARS,
+                    end: datetime = HISTORY_END) -> dict:
+    """Deterministic Synthea-like transaction bundle of roughly `resources` resources over `years` years."""
+    rng = random.Random(seed)
+    builder = BundleBuilder(rng)
+    model = PatientModel(rng)
+    start = end - timedelta(days=365.25 * years)
+
+    gender = rng.choice(["male", "female"])
+    age = rng.randint(30, 90)
+    birth = end - timedelta(days=365.25 * age + rng.randint(0, 364))
+    given, family = rng.choice(GIVEN_NAMES[gender]), rng.choice(FAMILY_NAMES)
+    city, postal = rng.choice(CITIES)
+    builder.patient_ref = builder.add({
+        "resourceType": "Patient",
+        "identifier": [{"system": "https://github.com/synthetichealth/synthea", "value": str(seed)}],
+        "name": [{"use": "official", "family": f"{family}{rng.randint(10, 999)}", "given": [f"{given}{rng.randint(10, 999)}"],
+                  "prefix": ["Mr." if gender == "male" else "Ms."]}],
+        "telecom": [{"system": "phone", "value": f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}", "use": "home"}],
+        "gender": gender,
+        "birthDate": birth.date().isoformat(),
+        "address": [{"line": [f"{rng.randint(1, 999)} {rng.choice(FAMILY_NAMES)} Street"], "city": city,
+                     "state": "MA", "postalCode": postal, "country": "US"}],
+    })
+
+    for code, display, category, criticality in rng.sample(ALLERGIES, rng.randint(0, 2)):
+        builder.add({
+            "resourceType": "AllergyIntolerance",
+            "clinicalStatus": _concept("http://terminology.hl7.org/CodeSystem/allergyintolerance-clinical", "active", "Active"),
+            "type": "allergy", "category": [category], "criticality": criticality,
+            "code": _concept(SNOMED, code, display),
+            "recordedDate": _timestamp(start),
+        })
+
+    # Chronic conditions start at random points of the history and are diagnosed at the next encounter
+    chronic = rng.sample(CHRONIC_CONDITIONS, rng.randint(0, 3))
+    onsets = sorted((start + timedelta(days=rng.uniform(0, 365.25 * years * 0.8)), condition) for condition in chronic)
+
+    encounters = max((resources - len(builder.entries)) // RESOURCES_PER_ENCOUNTER, 1)
+    span = (end - start).total_seconds()
+    times = sorted(start + timedelta(seconds=rng.uniform(0, span * 0.98)) for _ in range(encounters - 1))
+    times.append(end - timedelta(hours=12))  # current admission
+
+    for index, when in enumerate(times):
+        if len(builder.entries) >= resources and index < len(times) - 1:
+            continue  # budget spent; still emit the current admission
+        admission = index == len(times) - 1
+        code, display, encounter_class = ADMISSION if admission else rng.choices(ENCOUNTER_TYPES, weights=[6, 3, 1])[0]
+        hours = 12 if admission else rng.choice([0.25, 0.5, 1.0])
+        encounter = builder.add({
+            "resourceType": "Encounter",
+            "status": "in-progress" if admission else "finished",
+            "class": {"system": ACT_CODE, "code": encounter_class},
+            "type": [_concept(SNOMED, code, display)],
+            "period": {"start": _timestamp(when)} if admission else
+                      {"start": _timestamp(when), "end": _timestamp(when + timedelta(hours=hours))},
+        })
+
+        while onsets and onsets[0][0] <= when:
+            _, (condition_code, condition, medications, care_plan, shifts) = onsets.pop(0)
+            model.add_condition(shifts)
+            reference = builder.add({
+                "resourceType": "Condition",
+                "clinicalStatus": _concept(CONDITION_CLINICAL, "active", "Active"),
+                "code": _concept(SNOMED, condition_code, condition),
+                "encounter": {"reference": encounter},
+                "onsetDateTime": _timestamp(when), "recordedDate": _timestamp(when),
+            })
+            for rx_code, medication in medications:
+                builder.add({
+                    "resourceType": "MedicationRequest", "status": "active", "intent": "order",
+                    "medicationCodeableConcept": _concept(RXNORM, rx_code, medication),
+                    "encounter": {"reference": encounter}, "authoredOn": _timestamp(when),
+                    "dosage": [{"text": "Take 1 tablet by mouth daily", "sequence": 1}],
+                    "reasonReference": [{"reference": reference}],
+                })
+            if care_plan:
+                builder.add({
+                    "resourceType": "CarePlan", "status": "active", "intent": "order",
+                    "title": care_plan[1], "description": f"Care plan for {condition.split(' (')[0].lower()}",
+                    "category": [_concept(SNOMED, *care_plan)],
+                    "encounter": {"reference": encounter}, "period": {"start": _timestamp(when)},
+                    "addresses": [{"reference": reference}],
+                })
+
+        unwell = 0.0
+        if encounter_class != "AMB" or (code == "185345009" and rng.random() < 0.5):
+            unwell = 1.5 if admission else 1.0
+            acute_code, acute, medication = rng.choice(ACUTE_CONDITIONS)
+            resolved = when + timedelta(days=rng.randint(7, 21))
+            builder.add({
+                "resourceType": "Condition",
+                "clinicalStatus": _concept(CONDITION_CLINICAL, "active" if admission else "resolved",
+                                           "Active" if admission else "Resolved"),
+                "code": _concept(SNOMED, acute_code, acute),
+                "encounter": {"reference": encounter},
+                "onsetDateTime": _timestamp(when), "recordedDate": _timestamp(when),
+                **({} if admission else {"abatementDateTime": _timestamp(resolved)}),
+            })
+            if medication:
+                builder.add({
+                    "resourceType": "MedicationRequest", "status": "active" if admission else "completed",
+                    "intent": "order", "medicationCodeableConcept": _concept(RXNORM, *medication),
+                    "encounter": {"reference": encounter}, "authoredOn": _timestamp(when),
+                    "dosage": [{"text": "Take 1 capsule by mouth every 8 hours", "sequence": 1}],
+                })
+
+        # One vitals set per visit; the admission is charted every four hours
+        for chart in range(4 if admission else 1):
+            charted = when + timedelta(hours=4 * chart, minutes=rng.randint(0, 20))
+            for vital in VITAL_CODES:
+                builder.add(_observation(vital, "vital-signs", encounter, charted, model.value(vital, unwell)))
+            panel = _observation(BLOOD_PRESSURE[0], "vital-signs", encounter, charted, 0.0)
+            del panel["valueQuantity"]  # the panel carries its values in components
+            panel["code"] = _concept(LOINC, *BLOOD_PRESSURE_PANEL)
+            panel["component"] = [
+                {"code": _concept(LOINC, bp, REFERENCE_RANGES[bp][0]),
+                 "valueQuantity": {"value": model.value(bp, unwell), "unit": "mm[Hg]", "system": UCUM, "code": "mm[Hg]"}}
+                for bp in BLOOD_PRESSURE
+            ]
+            builder.add(panel)
+
+        if admission or rng.random() < 0.35:
+            resulted = when + timedelta(hours=1)
+            for panel in LAB_PANELS:
+                for lab in panel:
+                    builder.add(_observation(lab, "laboratory", encounter, resulted, model.value(lab, unwell)))
+            if A1C in model.shifts or rng.random() < 0.2:
+                builder.add(_observation(A1C, "laboratory", encounter, resulted, model.value(A1C)))
+
+        if rng.random() < 0.5:
+            procedure_code, procedure = rng.choice(PROCEDURES)
+            builder.add({
+                "resourceType": "Procedure", "status": "completed",
+                "code": _concept(SNOMED, procedure_code, procedure),
+                "encounter": {"reference": encounter},
+                "performedDateTime": _timestamp(when + timedelta(minutes=rng.randint(5, 45))),
+            })
+
+    return {"resourceType": "Bundle", "type": "transaction", "entry": builder.entries}
+
+
+def random_start_seed() -> int:
+    """
+    A random first seed. Sequences from two processes started this way do not overlap in practice,
+    so their patient ids stay unique.
+    """
+    return int.from_bytes(os.urandom(6), "big")
+
+
+class SyntheticPatients:
+    """A seeded sequence of bundles: call n uses seed + n, so a run is reproducible end to end."""
+
+    def __init__(self, seed: int = 1, resources: int = DEFAULT_RESOURCES, years: float = DEFAULT_YEARS):
+        self.seeds = itertools.count(seed)
+        self.resources = resources
+        self.years = years
+
+    def next(self, seed: Optional[int] = None, resources: Optional[int] = None, years: Optional[float] = None) -> dict:
+        return generate_bundle(
+            next(self.seeds) if seed is None else seed,
+            resources or self.resources,
+            years or self.years,
+        )
+
+
+def create_app(patients: SyntheticPatients):
+    """FastAPI stand-in for the Synthea Spring Boot service."""
+    from fastapi import FastAPI
+    from fastapi.responses import Response
+    from responses import encode_json
+
+    app = FastAPI()
+
+    @app.get("/generate-patient")
+    async def generate_patient(seed: Optional[int] = None, resources: Optional[int] = None, years: Optional[float] = None):
+        bundle = patients.next(seed, resources, years)
+        return Response(content=encode_json(bundle), media_type="application/fhir+json")
+
+    @app.get("/actuator/health")
+    async def health():
+        return {"status": "UP"}
+
+    return app
+
+
+def write_bundles(out: str, patients: SyntheticPatients, count: int) -> int:
+    """Writes `count` bundles as a Synthea-style directory or one NDJSON file; returns bytes written."""
+    written = 0
+    if out.endswith(".ndjson"):
+        with open(out, "w") as f:
+            for _ in range(count):
+                line = json.dumps(patients.next(), separators=(",", ":"))
+                f.write(line + "\n")
+                written += len(line) + 1
+        return written
+    os.makedirs(out, exist_ok=True)
+    for _ in range(count):
+        bundle = patients.next()
+        patient = bundle["entry"][0]["resource"]
+        path = os.path.join(out, f"{patient['name'][0]['given'][0]}_{patient['name'][0]['family']}_{patient['id']}.json")
+        with open(path, "w") as f:
+            text = json.dumps(bundle, indent=2)
+            f.write(text)
+        written += len(text)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded Synthea-like FHIR bundle generator")
+    parser.add_argument("command", choices=["serve", "write"])
+    parser.add_argument("out", nargs="?", help="Output directory, or a .ndjson file (write)")
+    parser.add_argument("--count", type=int, default=10, help="Bundles to write")
+    parser.add_argument("--seed", type=int, help="Seed of the first bundle; bundle n uses seed + n (default 1 for write, random for serve)")
+    parser.add_argument("--resources", type=int, default=DEFAULT_RESOURCES, help="Approximate resources per bundle")
+    parser.add_argument("--years", type=float, default=DEFAULT_YEARS, help="Years of history per bundle")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    if args.seed is None:
+        args.seed = random_start_seed() if args.command == "serve" else 1
+    patients = SyntheticPatients(args.seed, args.resources, args.years)
+    if args.command == "serve":
+        import uvicorn
+        uvicorn.run(create_app(patients), host=args.host, port=args.port)
+    else:
+        if not args.out:
+            parser.error("write needs an output directory or .ndjson file")
+        size = write_bundles(args.out, patients, args.count)
+        print(f"Wrote {args.count} bundles ({size / 1e6:.1f} MB) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
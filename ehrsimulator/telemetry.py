@@ -1,44 +1,153 @@
 """
 OpenTelemetry configuration for EHR Simulator
-Provides comprehensive tracing and logging for all requests, prompts, and responses.
+Provides tracing of requests, LLM calls and the summary pipeline, configured from the environment.
+
+TELEMETRY_PROFILE:
+- development (default): spans are printed to the console as they end (SimpleSpanProcessor).
+- production: batch processors only, so export happens on a background thread rather than the
+  request path. Spans go to OTLP_ENDPOINT, and to the console only when TELEMETRY_CONSOLE=on.
+- off: no tracer provider and no instrumentation.
+
+TELEMETRY_VERBOSITY:
+- minimal: server spans and LLM request spans, no span events.
+- standard (default): adds outgoing HTTP spans and summary pipeline stage spans.
+- detailed: adds SQL statement spans, ASGI send/receive spans and prompt/response preview events.
+  Previews contain patient data.
+
+Sampling:
+- Head: TELEMETRY_SAMPLE_RATIO keeps that share of new traces (parent-based).
+- Tail: TELEMETRY_TAIL_SAMPLING=on holds each trace until its local root span ends. It exports
+  traces with an error or a root span of at least TELEMETRY_SLOW_SECONDS, plus a
+  TELEMETRY_TAIL_KEEP_RATIO share of the rest.
 """
 
 import os
 import logging
-from datetime import datetime
-from typing import Optional, Dict, Any
+import random
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
 
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
 from opentelemetry.sdk.trace.export import (
     ConsoleSpanExporter,
     BatchSpanProcessor,
     SimpleSpanProcessor
 )
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.sdk.resources import Resource
+from opentelemetry.trace import SpanKind, Status, StatusCode
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
 from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
 from opentelemetry.instrumentation.logging import LoggingInstrumentor
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-
 logger = logging.getLogger(__name__)
 
+PROFILES = ("development", "production", "off")
+TELEMETRY_PROFILE = os.getenv("TELEMETRY_PROFILE", "development").lower()
+if TELEMETRY_PROFILE not in PROFILES:
+    raise ValueError(f"TELEMETRY_PROFILE must be one of {PROFILES}, got '{TELEMETRY_PROFILE}'")
+TELEMETRY_ENABLED = TELEMETRY_PROFILE != "off"
+TELEMETRY_CONSOLE = os.getenv("TELEMETRY_CONSOLE", "on" if TELEMETRY_PROFILE == "development" else "off").lower() in ("1", "on", "true", "yes")
+
+MINIMAL, STANDARD, DETAILED = 0, 1, 2
+VERBOSITY_LEVELS = {"minimal": MINIMAL, "standard": STANDARD, "detailed": DETAILED}
+TELEMETRY_VERBOSITY = os.getenv("TELEMETRY_VERBOSITY", "standard").lower()
+if TELEMETRY_VERBOSITY not in VERBOSITY_LEVELS:
+    raise ValueError(f"TELEMETRY_VERBOSITY must be one of {tuple(VERBOSITY_LEVELS)}, got '{TELEMETRY_VERBOSITY}'")
+VERBOSITY = VERBOSITY_LEVELS[TELEMETRY_VERBOSITY]
+
+TELEMETRY_SAMPLE_RATIO = float(os.getenv("TELEMETRY_SAMPLE_RATIO", "1.0"))
+TELEMETRY_TAIL_SAMPLING = os.getenv("TELEMETRY_TAIL_SAMPLING", "off").lower() in ("1", "on", "true", "yes")
+TELEMETRY_SLOW_SECONDS = float(os.getenv("TELEMETRY_SLOW_SECONDS", "1.0"))
+TELEMETRY_TAIL_KEEP_RATIO = float(os.getenv("TELEMETRY_TAIL_KEEP_RATIO", "0.0"))
+
+PREVIEW_CHARS = 200
+
+_tracer_provider: Optional[TracerProvider] = None
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """
+    Buffers the spans of each trace until its local root span ends, then passes the whole trace to
+    the delegate processors if it had an error, was slow, or falls in the keep ratio. Spans ending
+    after the decision (background work started by the request) follow it. At most max_traces
+    traces are buffered; the oldest are dropped beyond that.
+    """
+
+    def __init__(self, delegates: List[SpanProcessor], slow_seconds: float, keep_ratio: float = 0.0, max_traces: int = 2048):
+        self.delegates = delegates
+        self.slow_seconds = slow_seconds
+        self.keep_ratio = keep_ratio
+        self.max_traces = max_traces
+        self.pending: "OrderedDict[int, List[ReadableSpan]]" = OrderedDict()
+        self.decided: "OrderedDict[int, bool]" = OrderedDict()
+        self.kept = self.dropped = 0
+        self._lock = threading.Lock()  # spans also end in worker threads
+
+    def on_start(self, span, parent_context=None):
+        for delegate in self.delegates:
+            delegate.on_start(span, parent_context=parent_context)
+
+    def _keep(self, spans: List[ReadableSpan], root: ReadableSpan) -> bool:
+        if any(span.status.status_code == StatusCode.ERROR for span in spans):
+            return True
+        if (root.end_time - root.start_time) / 1e9 >= self.slow_seconds:
+            return True
+        return random.random() < self.keep_ratio
+
+    def on_end(self, span: ReadableSpan):
+        trace_id = span.context.trace_id
+        with self._lock:
+            if trace_id in self.decided:
+                spans, keep = [span], self.decided[trace_id]
+            else:
+                spans = self.pending.setdefault(trace_id, [])
+                spans.append(span)
+                if span.parent is not None and not span.parent.is_remote:
+                    while len(self.pending) > self.max_traces:
+                        self.pending.popitem(last=False)
+                        self.dropped += 1
+                    return
+                del self.pending[trace_id]
+                keep = self._keep(spans, span)
+                self.decided[trace_id] = keep
+                while len(self.decided) > self.max_traces:
+                    self.decided.popitem(last=False)
+                if keep:
+                    self.kept += 1
+                else:
+                    self.dropped += 1
+        if keep:
+            for buffered in spans:
+                for delegate in self.delegates:
+                    delegate.on_end(buffered)
+
+    def shutdown(self):
+        for delegate in self.delegates:
+            delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return all(delegate.force_flush(timeout_millis) for delegate in self.delegates)
+
+
 def setup_telemetry(service_name: str = "ehrsimulator", service_version: str = "1.0.0"):
     """
-    Set up OpenTelemetry tracing and logging for the EHR Simulator.
-    
+    Set up OpenTelemetry tracing for the EHR Simulator according to TELEMETRY_PROFILE.
+
     Args:
         service_name: Name of the service for tracing
         service_version: Version of the service
     """
-    
+    global _tracer_provider
+    if not TELEMETRY_ENABLED:
+        logger.info("OpenTelemetry disabled (TELEMETRY_PROFILE=off)")
+        return trace.get_tracer(__name__)
+
     # Create resource with service information
     resource = Resource.create({
         "service.name": service_name,
@@ -46,199 +155,138 @@ def setup_telemetry(service_name: str = "ehrsimulator", service_version: str = "
         "service.instance.id": os.getenv("HOSTNAME", "localhost"),
         "deployment.environment": os.getenv("ENVIRONMENT", "development")
     })
-    
-    # Create tracer provider
-    tracer_provider = TracerProvider(resource=resource)
-    
-    # Add span processors
-    # Console exporter for development
-    console_exporter = ConsoleSpanExporter()
-    tracer_provider.add_span_processor(SimpleSpanProcessor(console_exporter))
-    
+
+    # Create tracer provider; head sampling decides at the root span, children follow their parent
+    tracer_provider = TracerProvider(resource=resource, sampler=ParentBased(TraceIdRatioBased(TELEMETRY_SAMPLE_RATIO)))
+
+    # Add span processors. Development prints each span as it ends; production only ever batches
+    processors: List[SpanProcessor] = []
+    if TELEMETRY_CONSOLE:
+        console_exporter = ConsoleSpanExporter()
+        processors.append(SimpleSpanProcessor(console_exporter) if TELEMETRY_PROFILE == "development" else BatchSpanProcessor(console_exporter))
+
     # OTLP exporter for production (if configured)
     otlp_endpoint = os.getenv("OTLP_ENDPOINT")
     if otlp_endpoint:
         try:
             otlp_exporter = OTLPSpanExporter(endpoint=otlp_endpoint)
-            tracer_provider.add_span_processor(BatchSpanProcessor(otlp_exporter))
+            processors.append(BatchSpanProcessor(otlp_exporter))
             logger.info(f"OTLP exporter configured with endpoint: {otlp_endpoint}")
         except Exception as e:
             logger.warning(f"Failed to configure OTLP exporter: {e}")
-    
+
+    if TELEMETRY_TAIL_SAMPLING and processors:
+        processors = [TailSamplingProcessor(processors, TELEMETRY_SLOW_SECONDS, TELEMETRY_TAIL_KEEP_RATIO)]
+    for processor in processors:
+        tracer_provider.add_span_processor(processor)
+
     # Set the tracer provider
     trace.set_tracer_provider(tracer_provider)
-    
+    _tracer_provider = tracer_provider
+
     # Get the tracer
     tracer = trace.get_tracer(__name__)
-    
-    logger.info("OpenTelemetry setup completed")
+
+    logger.info(f"OpenTelemetry setup completed: profile={TELEMETRY_PROFILE}, verbosity={TELEMETRY_VERBOSITY}, "
+                f"sample_ratio={TELEMETRY_SAMPLE_RATIO}, tail_sampling={TELEMETRY_TAIL_SAMPLING}")
     return tracer
 
+def shutdown_telemetry():
+    """Flush batched spans and stop the exporters."""
+    if _tracer_provider is not None:
+        _tracer_provider.shutdown()
+
 def instrument_fastapi(app):
     """Instrument FastAPI application with OpenTelemetry."""
-    FastAPIInstrumentor.instrument_app(app)
+    if not TELEMETRY_ENABLED:
+        return
+    # send/receive spans add two spans per response chunk; only worth it when debugging streaming
+    FastAPIInstrumentor.instrument_app(app, exclude_spans=None if VERBOSITY >= DETAILED else ["receive", "send"])
+    # Instrumenting wraps build_middleware_stack; when called from a startup handler the stack is
+    # already built (the lifespan request builds it), so drop it to have the next request rebuild it
+    app.middleware_stack = None
     logger.info("FastAPI instrumentation completed")
 
 def instrument_httpx():
     """Instrument HTTPX client with OpenTelemetry."""
+    if not TELEMETRY_ENABLED or VERBOSITY < STANDARD:
+        return
     HTTPXClientInstrumentor().instrument()
     logger.info("HTTPX instrumentation completed")
 
-def instrument_sqlalchemy():
-    """Instrument SQLAlchemy with OpenTelemetry."""
-    SQLAlchemyInstrumentor().instrument()
+def instrument_sqlalchemy(engine=None):
+    """Instrument SQLAlchemy with OpenTelemetry; pass an existing engine to trace its statements."""
+    if not TELEMETRY_ENABLED or VERBOSITY < DETAILED:
+        return
+    SQLAlchemyInstrumentor().instrument(engine=engine)
     logger.info("SQLAlchemy instrumentation completed")
 
 def instrument_logging():
     """Instrument Python logging with OpenTelemetry."""
-    LoggingInstrumentor().instrument()
+    if not TELEMETRY_ENABLED or VERBOSITY < STANDARD:
+        return
+    # Trace and span ids on every record, written by LOG_FORMAT=json
+    LoggingInstrumentor().instrument(inject_trace_context=True)
     logger.info("Logging instrumentation completed")
 
-def log_llm_request(tracer, model: str, prompt: str, response: str, duration: float, 
-                   status: str = "success", error: Optional[str] = None):
+def _preview(text: str) -> str:
+    return text[:PREVIEW_CHARS] + "..." if len(text) > PREVIEW_CHARS else text
+
+@contextmanager
+def traced(name: str, level: int = STANDARD, **attributes) -> Iterator[trace.Span]:
+    """
+    Span around a block of real work, recorded when TELEMETRY_VERBOSITY reaches `level`.
+    Below that level the block runs under a non-recording span.
+    """
+    if not TELEMETRY_ENABLED or VERBOSITY < level:
+        yield trace.INVALID_SPAN
+        return
+    with trace.get_tracer(__name__).start_as_current_span(name, attributes=attributes) as span:
+        yield span
+
+@contextmanager
+def llm_request_span(model: str, prompt: str) -> Iterator[trace.Span]:
     """
-    Log detailed LLM request information with OpenTelemetry spans.
-    
+    Client span around one LLM request; report its outcome with record_llm_result.
+
     Args:
-        tracer: OpenTelemetry tracer
         model: LLM model name
         prompt: Input prompt
+    """
+    with trace.get_tracer(__name__).start_as_current_span(
+        "llm_request", kind=SpanKind.CLIENT, attributes={"llm.model": model, "llm.prompt_length": len(prompt)}
+    ) as span:
+        if VERBOSITY >= DETAILED and span.is_recording():
+            span.add_event("llm.prompt", {"preview": _preview(prompt)})
+        yield span
+
+def record_llm_result(span: trace.Span, model: str, response: str, duration: float, error: Optional[str] = None):
+    """
+    Set the outcome of an LLM request on its span and log it.
+
+    Args:
+        span: Span from llm_request_span
+        model: LLM model name
         response: LLM response
         duration: Request duration in seconds
-        status: Request status (success/error)
         error: Error message if any
     """
-    
-    with tracer.start_as_current_span("llm_request") as span:
-        # Add attributes to span
-        span.set_attribute("llm.model", model)
-        span.set_attribute("llm.prompt_length", len(prompt))
+    status = "error" if error else "success"
+    if span.is_recording():
         span.set_attribute("llm.response_length", len(response))
-        span.set_attribute("llm.duration_seconds", duration)
         span.set_attribute("llm.status", status)
-        
         if error:
             span.set_attribute("llm.error", error)
-            span.set_status(trace.Status(trace.StatusCode.ERROR, error))
-        else:
-            span.set_status(trace.Status(trace.StatusCode.OK))
-        
-        # Add events with detailed information
-        span.add_event("llm.request_start", {
-            "timestamp": datetime.utcnow().isoformat(),
-            "model": model,
-            "prompt_preview": prompt[:200] + "..." if len(prompt) > 200 else prompt
-        })
-        
-        span.add_event("llm.response_received", {
-            "timestamp": datetime.utcnow().isoformat(),
-            "response_preview": response[:200] + "..." if len(response) > 200 else response,
-            "duration_seconds": duration
-        })
-        
-        # Log detailed information
-        logger.info(f"LLM Request - Model: {model}, Duration: {duration:.2f}s, Status: {status}")
-        if error:
-            logger.error(f"LLM Error: {error}")
-        
-        return span
+            span.set_status(Status(StatusCode.ERROR, error))
+        elif VERBOSITY >= DETAILED:
+            span.add_event("llm.response", {"preview": _preview(response)})
 
-def log_api_request(tracer, method: str, path: str, status_code: int, duration: float,
-                   request_body: Optional[Dict[str, Any]] = None, response_body: Optional[Dict[str, Any]] = None):
-    """
-    Log detailed API request information with OpenTelemetry spans.
-    
-    Args:
-        tracer: OpenTelemetry tracer
-        method: HTTP method
-        path: Request path
-        status_code: HTTP status code
-        duration: Request duration in seconds
-        request_body: Request body (optional)
-        response_body: Response body (optional)
-    """
-    
-    with tracer.start_as_current_span("api_request") as span:
-        # Add attributes to span
-        span.set_attribute("http.method", method)
-        span.set_attribute("http.route", path)
-        span.set_attribute("http.status_code", status_code)
-        span.set_attribute("http.duration_seconds", duration)
-        
-        # Set span status based on status code
-        if 200 <= status_code < 400:
-            span.set_status(trace.Status(trace.StatusCode.OK))
-        else:
-            span.set_status(trace.Status(trace.StatusCode.ERROR, f"HTTP {status_code}"))
-        
-        # Add events with detailed information
-        span.add_event("api.request_start", {
-            "timestamp": datetime.utcnow().isoformat(),
-            "method": method,
-            "path": path,
-            "request_body_size": len(str(request_body)) if request_body else 0
-        })
-        
-        span.add_event("api.response_sent", {
-            "timestamp": datetime.utcnow().isoformat(),
-            "status_code": status_code,
-            "response_body_size": len(str(response_body)) if response_body else 0,
-            "duration_seconds": duration
-        })
-        
-        # Log detailed information
-        logger.info(f"API Request - {method} {path} - Status: {status_code}, Duration: {duration:.3f}s")
-        
-        if request_body:
-            logger.debug(f"Request Body: {request_body}")
-        if response_body:
-            logger.debug(f"Response Body: {response_body}")
-        
-        return span
-
-def log_database_operation(tracer, operation: str, table: str, duration: float, 
-                          success: bool = True, error: Optional[str] = None):
-    """
-    Log detailed database operation information with OpenTelemetry spans.
-    
-    Args:
-        tracer: OpenTelemetry tracer
-        operation: Database operation (SELECT, INSERT, UPDATE, DELETE)
-        table: Table name
-        duration: Operation duration in seconds
-        success: Whether operation was successful
-        error: Error message if any
-    """
-    
-    with tracer.start_as_current_span("database_operation") as span:
-        # Add attributes to span
-        span.set_attribute("db.operation", operation)
-        span.set_attribute("db.table", table)
-        span.set_attribute("db.duration_seconds", duration)
-        span.set_attribute("db.success", success)
-        
-        if error:
-            span.set_attribute("db.error", error)
-            span.set_status(trace.Status(trace.StatusCode.ERROR, error))
-        else:
-            span.set_status(trace.Status(trace.StatusCode.OK))
-        
-        # Add events
-        span.add_event("db.operation_start", {
-            "timestamp": datetime.utcnow().isoformat(),
-            "operation": operation,
-            "table": table
-        })
-        
-        span.add_event("db.operation_complete", {
-            "timestamp": datetime.utcnow().isoformat(),
-            "success": success,
-            "duration_seconds": duration
-        })
-        
-        # Log detailed information
-        logger.info(f"Database Operation - {operation} on {table} - Duration: {duration:.3f}s, Success: {success}")
-        if error:
-            logger.error(f"Database Error: {error}")
-        
-        return span 
\ No newline at end of file
+    logger.info(f"LLM Request - Model: {model}, Duration: {duration:.2f}s, Status: {status}")
+    if error:
+        logger.error(f"LLM Error: {error}")
+
+def annotate_span(**attributes):
+    """Add attributes to the current span (e.g. the server span of the request being handled)."""
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.set_attributes(attributes)
@@ -0,0 +1,138 @@
+"""
+Patient timeline rendering and context-sized chunking for map-reduce summaries.
+
+Every dated clinical resource in a bundle becomes one compact line, ordered by
+date. Lines are grouped by calendar year and whole years are packed greedily
+into chunks that fit a token budget (a year too large for one chunk is split).
+Because packing runs from the oldest data forward, appending new data only
+changes the last chunk, so summaries of earlier chunks stay valid.
+"""
+
+from typing import Dict, List, Optional
+
+from fhir_query import resource_date
+
+# Billing, provenance and logistics resources carry no clinical narrative
+TIMELINE_EXCLUDED = {"Patient", "Claim", "ExplanationOfBenefit", "Provenance", "SupplyDelivery", "Medication"}
+
+CHARS_PER_TOKEN = 4  # Conservative average for English clinical text
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _concept_text(concept: Optional[dict]) -> Optional[str]:
+    if not isinstance(concept, dict):
+        return None
+    return concept.get("text") or next((c.get("display") for c in concept.get("coding", []) if c.get("display")), None)
+
+
+def _first_concept(value) -> Optional[dict]:
+    """CodeableConcept from an element that may be a single concept or a list of them."""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def _quantity_text(quantity: Optional[dict]) -> Optional[str]:
+    if not isinstance(quantity, dict) or quantity.get("value") is None:
+        return None
+    value = quantity["value"]
+    value = f"{round(value, 2):g}" if isinstance(value, (int, float)) else str(value)
+    return f"{value} {quantity.get('unit', '')}".strip()
+
+
+def describe_resource(resource: dict) -> Optional[str]:
+    """One-line description of a clinical resource, or None when it has nothing to say."""
+    resource_type = resource.get("resourceType")
+    status = resource.get("status") or _concept_text(resource.get("clinicalStatus"))
+
+    if resource_type == "Observation":
+        value = _quantity_text(resource.get("valueQuantity")) or resource.get("valueString") \
+            or _concept_text(resource.get("valueCodeableConcept"))
+        components = [
+            f"{_concept_text(c.get('code'))} {_quantity_text(c.get('valueQuantity'))}"
+            for c in resource.get("component", []) if _quantity_text(c.get("valueQuantity"))
+        ]
+        if components and not value:
+            value = ", ".join(components)
+        return f"Observation: {_concept_text(resource.get('code'))}: {value}" if value else None
+    if resource_type == "Encounter":
+        reasons = ", ".join(filter(None, (_concept_text(r) for r in resource.get("reasonCode", []))))
+        text = f"Encounter: {_concept_text(_first_concept(resource.get('type'))) or 'encounter'}"
+        return f"{text} (reason: {reasons})" if reasons else text
+    if resource_type in ("MedicationRequest", "MedicationStatement", "MedicationAdministration"):
+        return f"{resource_type}: {_concept_text(resource.get('medicationCodeableConcept')) or 'medication'} ({status})"
+    if resource_type == "Immunization":
+        return f"Immunization: {_concept_text(resource.get('vaccineCode'))}"
+    if resource_type == "CareTeam":
+        return None
+
+    name = _concept_text(resource.get("code")) or _concept_text(_first_concept(resource.get("type"))) \
+        or _concept_text(_first_concept(resource.get("category")))
+    if not name:
+        return None
+    return f"{resource_type}: {name} ({status})" if status else f"{resource_type}: {name}"
+
+
+def build_timeline(bundle: dict) -> List[Dict]:
+    """Dated clinical resources as [{"date", "text"}], oldest first."""
+    events = []
+    for entry in (bundle or {}).get("entry", []):
+        resource = entry.get("resource") or {}
+        if resource.get("resourceType") in TIMELINE_EXCLUDED:
+            continue
+        date = resource_date(resource)
+        text = describe_resource(resource) if date else None
+        if text:
+            events.append({"date": date[:10], "text": text})
+    events.sort(key=lambda event: event["date"])  # stable, so same-day events keep bundle order
+    return events
+
+
+def _period(events: List[Dict]) -> str:
+    first, last = events[0]["date"][:4], events[-1]["date"][:4]
+    return first if first == last else f"{first}-{last}"
+
+
+def chunk_timeline(events: List[Dict], token_budget: int) -> List[Dict]:
+    """
+    Pack timeline events into chunks of at most `token_budget` (estimated) tokens,
+    keeping whole years together where they fit.
+    Returns [{"period", "text", "events", "tokens"}].
+    """
+    years: List[List[Dict]] = []
+    for event in events:
+        if years and years[-1][0]["date"][:4] == event["date"][:4]:
+            years[-1].append(event)
+        else:
+            years.append([event])
+
+    chunks: List[Dict] = []
+    current: List[str] = []
+    current_events: List[Dict] = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_events, current_tokens
+        if current:
+            chunks.append({"period": _period(current_events), "text": "\n".join(current),
+                           "events": len(current_events), "tokens": current_tokens})
+        current, current_events, current_tokens = [], [], 0
+
+    for year in years:
+        lines = [f"{event['date']} {event['text']}" for event in year]
+        year_tokens = sum(estimate_tokens(line) for line in lines)
+        if current and current_tokens + year_tokens > token_budget:
+            flush()
+        for event, line in zip(year, lines):
+            # Only a single oversized year is split mid-year
+            line_tokens = estimate_tokens(line)
+            if current and current_tokens + line_tokens > token_budget:
+                flush()
+            current.append(line)
+            current_events.append(event)
+            current_tokens += line_tokens
+    flush()
+    return chunks